@@ -0,0 +1,124 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from data_ingestion import load_customer_data
+from db_profiles import PROFILES
+from db_setup import init_db
+from db_utils import DatabaseManager
+from multi_ingestion import VERTICAL_FILES
+
+# DatabaseManager methods timed by benchmark_profiles, with their arguments
+QUERY_METHODS = [
+    ('get_top_customers', (10,)),
+    ('get_all_customers', ()),
+    ('get_product_sales', ()),
+    ('get_sales_by_category', ()),
+    ('get_sales_trends', (365,)),
+    ('get_engagement_breakdown', ('Outcome',)),
+    ('get_customer_recency', ()),
+    ('get_all_orders', ()),
+]
+
+def scaled_copy(csv_file, scale, out_dir):
+    """
+    Write a copy of a customer CSV with every row repeated `scale` times. Copies get
+    distinct street addresses, so they load as distinct customers and orders.
+    """
+    df = pd.read_csv(csv_file)
+    copies = []
+    for i in range(scale):
+        copy = df.copy()
+        copy['Street Address'] = copy['Street Address'] + f' #{i}'
+        copies.append(copy)
+    out_file = os.path.join(out_dir, f'x{scale}_' + os.path.basename(csv_file))
+    pd.concat(copies, ignore_index=True).to_csv(out_file, index=False)
+    return out_file
+
+def _time_load(csv_file, db_path, **kwargs):
+    """Load a CSV into a fresh database and return the elapsed seconds."""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    init_db(db_path)
+    start = time.perf_counter()
+    # Scratch loads stay out of the ingest metrics history
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_customer_data(csv_file, db_path=db_path, metrics_file=None, **kwargs)
+    return time.perf_counter() - start
+
+def benchmark_ingestion(csv_files, scale=10, chunksize=5000, repeat=3):
+    """Compare ingestion modes on scaled copies of the vertical CSVs."""
+    modes = [
+        ('default', {}),
+        ('chunked', {'chunksize': chunksize}),
+        ('bulk', {'bulk': True}),
+        ('chunked+bulk', {'chunksize': chunksize, 'bulk': True}),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'benchmark.db')
+        for csv_file in csv_files:
+            source = scaled_copy(csv_file, scale, tmp_dir)
+            rows = sum(1 for _ in open(source, 'rb')) - 1
+            for mode, kwargs in modes:
+                best = min(_time_load(source, db_path, **kwargs) for _ in range(repeat))
+                results.append({'file': os.path.basename(csv_file), 'mode': mode, 'rows': rows,
+                                'seconds': round(best, 3), 'rows_per_sec': round(rows / best)})
+
+    report = pd.DataFrame(results)
+    print(report.to_string(index=False))
+    return report
+
+def benchmark_profiles(db_path, profiles=None, date_range_days=90, repeat=5):
+    """
+    Time every DatabaseManager query method under each connection profile, over
+    all history and over the last `date_range_days` days of orders.
+    """
+    profiles = profiles or list(PROFILES)
+    results = []
+    for profile in profiles:
+        db = DatabaseManager(db_path, profile=profile)
+        last_day = db.execute_query('SELECT MAX(order_day) FROM daily_sales')[0][0] or 0
+        end_date = pd.Timestamp(last_day, unit='D').date()
+        date_filters = [('all', (None, None)),
+                        (f'last {date_range_days}d', (end_date - pd.Timedelta(days=date_range_days), end_date))]
+        for label, date_filter in date_filters:
+            db.set_date_filter(*date_filter)
+            for method, args in QUERY_METHODS:
+                getattr(db, method)(*args)  # Warm the OS page cache once
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    getattr(db, method)(*args)
+                    timings.append(time.perf_counter() - start)
+                results.append({'profile': profile, 'range': label, 'method': method,
+                                'ms': round(1000 * min(timings), 2)})
+
+    report = pd.DataFrame(results).pivot_table(index=['method', 'range'], columns='profile', values='ms')
+    print(report.to_string())
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the ingestion pipeline.')
+    parser.add_argument('sources', nargs='*', default=VERTICAL_FILES,
+                        help='CSV files to benchmark (defaults to all vertical feeds)')
+    parser.add_argument('--scale', type=int, default=10,
+                        help='Repeat every CSV row this many times')
+    parser.add_argument('--chunksize', type=int, default=5000,
+                        help='Chunk size for the chunked modes')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per mode; the best time is reported')
+    parser.add_argument('--profiles', metavar='DB_PATH',
+                        help='Instead of ingestion, time the dashboard queries on DB_PATH under each connection profile')
+    args = parser.parse_args()
+
+    if args.profiles:
+        benchmark_profiles(args.profiles, repeat=args.repeat)
+    else:
+        benchmark_ingestion(args.sources, scale=args.scale, chunksize=args.chunksize, repeat=args.repeat)
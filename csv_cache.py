@@ -0,0 +1,344 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = 'data/csv_cache'
+
+# Text columns with at most this share of distinct values are dictionary-encoded
+CATEGORY_MAX_RATIO = 0.5
+
+# While building, a text column stops being considered for dictionary encoding once
+# it has more distinct values than this and than that share of the rows read so far
+CATEGORY_MIN_DISTINCT = 10_000
+
+# Text columns whose every value round-trips through one of these are stored as dates
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y']
+
+# Rows parsed at a time while building a snapshot
+BUILD_CHUNKSIZE = 50_000
+
+def file_hash(path, block_size=1 << 20):
+    """Hash a file's contents; snapshots are keyed by this."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _matches_date_format(values, fmt):
+    """Whether every value round-trips through the date format."""
+    # Try a small sample first so text columns are rejected cheaply
+    for sample in (values.head(100), values):
+        parsed = pd.to_datetime(sample, format=fmt, errors='coerce')
+        if parsed.isna().any() or not (parsed.dt.strftime(fmt) == sample).all():
+            return False
+    return True
+
+def _smallest_int_dtype(max_value):
+    for dtype in (np.int8, np.int16, np.int32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _is_numeric(series):
+    return pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)
+
+class _ColumnScan:
+    """What the first pass over a CSV learns about one column, chunk by chunk."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.dtypes = set()
+        self.missing_chunks = False
+        self.has_text = False
+        self.text_values = 0
+        self.formats = list(DATE_FORMATS)
+        # Distinct text values in order of first appearance, until there are too
+        # many for dictionary encoding
+        self.categories = {}
+
+    def add(self, series):
+        self.rows += len(series)
+        if series.isna().all():
+            # A chunk with nothing in it reads as float64, whatever the column holds
+            self.missing_chunks = True
+            return
+        if _is_numeric(series):
+            self.dtypes.add(series.dtype)
+            return
+        values = series.dropna()
+        self.has_text = True
+        self.text_values += len(values)
+        self.formats = [fmt for fmt in self.formats if _matches_date_format(values, fmt)]
+        if self.categories is not None:
+            self.categories.update(dict.fromkeys(pd.unique(values)))
+            if len(self.categories) > CATEGORY_MIN_DISTINCT and len(self.categories) > CATEGORY_MAX_RATIO * self.rows:
+                self.categories = None
+
+    def kind(self):
+        """How the whole column is stored: 'numeric', 'date', 'category' or 'string'."""
+        if not self.has_text:
+            return 'numeric'
+        # Numbers read as text in some chunks and as numbers in others stay plain strings
+        if self.dtypes:
+            return 'string'
+        if self.formats:
+            return 'date'
+        if self.categories is not None and len(self.categories) <= CATEGORY_MAX_RATIO * self.rows:
+            return 'category'
+        return 'string'
+
+    def dtype(self):
+        """The dtype of a numeric column: what reading it whole would give."""
+        return np.result_type(*self.dtypes, *([np.float64] if self.missing_chunks or not self.dtypes else []))
+
+class _ColumnWriter:
+    """
+    Second pass: write one column's chunks into place. Arrays are memory-mapped
+    files sized from the first pass, so only the current chunk is held in memory.
+    """
+
+    def __init__(self, directory, base, scan):
+        self.directory = directory
+        self.kind = scan.kind()
+        self.entry = {'name': scan.name, 'kind': self.kind}
+        self.position = 0
+        nrows = scan.rows
+
+        if self.kind == 'numeric':
+            dtype = scan.dtype()
+            self.values = self._open_array(f'{base}.npy', dtype, nrows)
+            self.entry['dtype'] = str(dtype)
+        elif self.kind == 'date':
+            self.format = scan.formats[0]
+            self.values = self._open_array(f'{base}.npy', 'datetime64[s]', nrows)
+            self.entry['format'] = self.format
+        elif self.kind == 'category':
+            self.categories = pd.Index(list(scan.categories))
+            self.values = self._open_array(f'{base}.npy', _smallest_int_dtype(len(self.categories)), nrows)
+            with open(os.path.join(directory, f'{base}.json'), 'w') as f:
+                json.dump([str(c) for c in self.categories], f)
+        else:
+            # Free text: one UTF-8 blob plus byte and character offsets of every value
+            self.blob = open(os.path.join(directory, f'{base}.bin'), 'wb')
+            self.char_offsets = self._open_array(f'{base}.chars.npy', np.int64, nrows + 1)
+            self.byte_offsets = self._open_array(f'{base}.bytes.npy', np.int64, nrows + 1)
+            self.missing = self._open_array(f'{base}.missing.npy', np.bool_, nrows)
+            self.char_offsets[0] = self.byte_offsets[0] = 0
+
+    def _open_array(self, file_name, dtype, length):
+        return np.lib.format.open_memmap(os.path.join(self.directory, file_name), mode='w+', dtype=dtype,
+                                         shape=(length,))
+
+    def add(self, series):
+        start, stop = self.position, self.position + len(series)
+        self.position = stop
+
+        if self.kind == 'numeric':
+            self.values[start:stop] = series.to_numpy()
+            return
+        values = series.astype(object)
+        if self.kind == 'date':
+            self.values[start:stop] = pd.to_datetime(values, format=self.format).to_numpy(dtype='datetime64[s]')
+            return
+        if self.kind == 'category':
+            # Dictionary encoding: small integer codes (-1 for missing) plus the distinct values
+            self.values[start:stop] = self.categories.get_indexer(values)
+            return
+
+        missing = values.isna().to_numpy()
+        strings = [s if isinstance(s, str) else str(s) for s in values.where(~missing, '')]
+        encoded = [s.encode('utf-8') for s in strings]
+        self.char_offsets[start + 1:stop + 1] = self.char_offsets[start] + np.cumsum([len(s) for s in strings])
+        self.byte_offsets[start + 1:stop + 1] = self.byte_offsets[start] + np.cumsum([len(b) for b in encoded])
+        self.missing[start:stop] = missing
+        self.blob.write(b''.join(encoded))
+
+    def close(self):
+        for name in ('values', 'char_offsets', 'byte_offsets', 'missing'):
+            if hasattr(self, name):
+                getattr(self, name).flush()
+        if self.kind == 'string':
+            self.blob.close()
+        return self.entry
+
+class CsvSnapshot:
+    """
+    Columnar snapshot of a parsed CSV. Columns are memory-mapped when first used,
+    and only the rows and columns asked for are decoded.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.nrows = self.meta['nrows']
+        self.columns = [entry['name'] for entry in self.meta['columns']]
+        self._entries = {entry['name']: (f'c{i}', entry) for i, entry in enumerate(self.meta['columns'])}
+        self._arrays = {}
+
+    def _array(self, file_name):
+        if file_name not in self._arrays:
+            path = os.path.join(self.directory, file_name)
+            if file_name.endswith('.npy'):
+                self._arrays[file_name] = np.load(path, mmap_mode='r')
+            elif os.path.getsize(path):
+                self._arrays[file_name] = np.memmap(path, dtype=np.uint8, mode='r')
+            else:
+                self._arrays[file_name] = np.empty(0, dtype=np.uint8)
+        return self._arrays[file_name]
+
+    def _categories(self, base):
+        key = f'{base}.json'
+        if key not in self._arrays:
+            with open(os.path.join(self.directory, key)) as f:
+                # The trailing NaN is what code -1 (missing) indexes
+                self._arrays[key] = np.array(json.load(f) + [np.nan], dtype=object)
+        return self._arrays[key]
+
+    def column(self, name, start=0, stop=None, parse_dates=False, as_category=False):
+        """
+        Decode rows [start, stop) of one column. Values match what pd.read_csv
+        returns, so dates come back as their original strings unless parse_dates
+        is set, and dictionary-encoded text as plain strings unless as_category is.
+        """
+        base, entry = self._entries[name]
+        stop = self.nrows if stop is None else min(stop, self.nrows)
+
+        if entry['kind'] == 'numeric':
+            return np.array(self._array(f'{base}.npy')[start:stop])
+
+        if entry['kind'] == 'date':
+            dates = np.array(self._array(f'{base}.npy')[start:stop])
+            if parse_dates:
+                return pd.Series(dates)
+            # Format each distinct date once; a column rarely spans more than a few thousand days
+            unique_dates, inverse = np.unique(dates, return_inverse=True)
+            text = pd.DatetimeIndex(unique_dates).strftime(entry['format']).to_numpy(dtype=object)
+            return text[inverse.reshape(-1)]
+
+        if entry['kind'] == 'category':
+            codes = np.array(self._array(f'{base}.npy')[start:stop])
+            categories = self._categories(base)
+            if as_category:
+                return pd.Categorical.from_codes(codes, categories[:-1])
+            return categories[codes]
+
+        byte_offsets = self._array(f'{base}.bytes.npy')
+        char_offsets = np.asarray(self._array(f'{base}.chars.npy')[start:stop + 1]) - self._array(f'{base}.chars.npy')[start]
+        text = self._array(f'{base}.bin')[byte_offsets[start]:byte_offsets[stop]].tobytes().decode('utf-8')
+        bounds = char_offsets.tolist()
+        values = np.array([text[a:b] for a, b in zip(bounds, bounds[1:])], dtype=object)
+        values[np.asarray(self._array(f'{base}.missing.npy')[start:stop])] = np.nan
+        return values
+
+    def read(self, columns=None, start=0, stop=None, **kwargs):
+        """Decode rows [start, stop) of the given columns (default: all) into a DataFrame."""
+        columns = self.columns if columns is None else [c for c in self.columns if c in columns]
+        stop = self.nrows if stop is None else min(stop, self.nrows)
+        data = {name: self.column(name, start, stop, **kwargs) for name in columns}
+        return pd.DataFrame(data, index=pd.RangeIndex(start, stop))
+
+    def iter_chunks(self, chunksize, columns=None, **kwargs):
+        """Decode the snapshot chunk by chunk, like pd.read_csv(chunksize=...)."""
+        for start in range(0, self.nrows, chunksize):
+            yield self.read(columns, start, start + chunksize, **kwargs)
+
+def _evict_stale(cache_dir, source, keep):
+    """Remove the snapshots of earlier versions of a CSV, keeping the directory `keep`."""
+    for name in os.listdir(cache_dir):
+        directory = os.path.join(cache_dir, name)
+        if directory == keep:
+            continue
+        try:
+            with open(os.path.join(directory, 'meta.json')) as f:
+                stale = json.load(f)['source'] == source
+        except (OSError, ValueError, KeyError):
+            continue
+        if stale:
+            shutil.rmtree(directory, ignore_errors=True)
+
+def build_snapshot(csv_file, cache_dir=CACHE_DIR, digest=None, chunksize=BUILD_CHUNKSIZE):
+    """
+    Parse a CSV once and store it as a columnar snapshot under cache_dir/<file hash>,
+    replacing the snapshots of its earlier versions. The CSV is read chunk by
+    chunk twice, first to settle every column's encoding and then to write it,
+    so memory use doesn't grow with the file.
+    """
+    digest = digest or file_hash(csv_file)
+    source = os.path.abspath(csv_file)
+    target = os.path.join(cache_dir, digest)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    scans = None
+    for df in pd.read_csv(csv_file, chunksize=chunksize):
+        scans = scans or [_ColumnScan(name) for name in df.columns]
+        for scan, name in zip(scans, df.columns):
+            scan.add(df[name])
+    if scans is None:
+        scans = [_ColumnScan(name) for name in pd.read_csv(csv_file, nrows=0).columns]
+    nrows = scans[0].rows if scans else 0
+
+    # Build in a scratch directory and move it into place, so readers never see half a snapshot
+    scratch = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        writers = [_ColumnWriter(scratch, f'c{i}', scan) for i, scan in enumerate(scans)]
+        for df in pd.read_csv(csv_file, chunksize=chunksize):
+            for writer, name in zip(writers, df.columns):
+                writer.add(df[name] if writer.kind != 'string' or not _is_numeric(df[name])
+                           else df[name].astype(str).where(df[name].notna()))
+        entries = [writer.close() for writer in writers]
+        with open(os.path.join(scratch, 'meta.json'), 'w') as f:
+            json.dump({'source': source, 'hash': digest, 'nrows': nrows, 'columns': entries}, f, indent=2)
+        os.replace(scratch, target)
+    except OSError:
+        # Another process built the same snapshot first
+        if not os.path.exists(os.path.join(target, 'meta.json')):
+            raise
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    _evict_stale(cache_dir, source, target)
+    return CsvSnapshot(target)
+
+def open_snapshot(csv_file, cache_dir=CACHE_DIR, build=True):
+    """Open the snapshot of a CSV's current contents, building it if needed (or None with build=False)."""
+    digest = file_hash(csv_file)
+    directory = os.path.join(cache_dir, digest)
+    if os.path.exists(os.path.join(directory, 'meta.json')):
+        return CsvSnapshot(directory)
+    return build_snapshot(csv_file, cache_dir, digest) if build else None
+
+def read_csv_cached(csv_file, usecols=None, chunksize=None, cache_dir=CACHE_DIR, **kwargs):
+    """Drop-in for pd.read_csv(csv_file, usecols=..., chunksize=...) served from the snapshot cache."""
+    snapshot = open_snapshot(csv_file, cache_dir)
+    if chunksize:
+        return snapshot.iter_chunks(chunksize, usecols, **kwargs)
+    return snapshot.read(usecols, **kwargs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build columnar snapshots of customer CSVs and compare load times.')
+    parser.add_argument('sources', nargs='+', help='CSV files to snapshot')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='Snapshot cache directory')
+    args = parser.parse_args()
+
+    for csv_file in args.sources:
+        start = time.perf_counter()
+        parsed = pd.read_csv(csv_file)
+        parse_time = time.perf_counter() - start
+
+        snapshot = open_snapshot(csv_file, args.cache_dir)
+        start = time.perf_counter()
+        cached = open_snapshot(csv_file, args.cache_dir).read()
+        cached_time = time.perf_counter() - start
+
+        print(f"{csv_file}: {len(parsed)} rows, CSV parse {parse_time:.3f}s, "
+              f"snapshot load {cached_time:.3f}s ({snapshot.directory})")
@@ -1,216 +1,906 @@
+import argparse
+import contextlib
+import hashlib
+import io
 import pandas as pd
-import sqlite3
 from datetime import datetime
-import uuid
 import numpy as np
 import time
 import os
 
-def get_db_connection():
-    """Create a database connection with proper timeout and isolation level."""
-    conn = sqlite3.connect('data/farm_customers.db', timeout=20)
-    conn.execute('PRAGMA journal_mode=WAL')  # Use Write-Ahead Logging
-    return conn
+from csv_cache import read_csv_cached
+from db_profiles import connect
+from db_writer import DatabaseWriter
+from ingest_metrics import METRICS_FILE, IngestMetrics, _peak_rss_mb, print_report, stage, write_report
+from db_setup import ENGAGEMENT_LOOKUPS, init_db, update_customer_summaries, update_daily_rollups
+from order_partitions import skip_partitioned_orders
 
-def load_customer_data(csv_file):
-    max_retries = 3
-    retry_delay = 2  # seconds
+# Columns of the customer CSVs that the loader uses
+CSV_COLUMNS = ['First Name', 'Last Name', 'Street Address', 'City', 'State', 'Zip Code',
+               'Purchase Item', 'Purchase Date', 'Purchase Quantity', 'Date, First Purchase - Last Purchase']
+
+# Purchase Date formats seen across the vertical feeds, in order of preference
+PURCHASE_DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', '%d/%m/%Y']
+
+# Number of Purchase Date values the format is detected from
+DATE_FORMAT_SAMPLE_SIZE = 100
+
+# Rows that can't be loaded are appended to a CSV per source file here
+REJECTS_DIR = 'data/rejects'
+
+# "Date, First Purchase - Last Purchase" values look like "2024-05-10, 2023-09-01 - 2025-03-13"
+PURCHASE_HISTORY_PATTERN = r'^\s*(\d{4}-\d{2}-\d{2})\s*,\s*(\d{4}-\d{2}-\d{2})\s*-\s*(\d{4}-\d{2}-\d{2})\s*$'
+
+# Optional CRM engagement columns, loaded when a feed has them
+ENGAGEMENT_COLUMNS = list(ENGAGEMENT_LOOKUPS)
+
+DB_PATH = 'data/farm_customers.db'
+
+# Page cache size used during bulk loads, in KiB
+BULK_CACHE_SIZE_KIB = 256 * 1024
+
+# Bytes hashed at each end of the loaded part of a file to fingerprint it in the ledger
+LEDGER_SAMPLE_BYTES = 64 * 1024
+
+# Follow mode loads new rows once this many bytes of them are waiting
+FOLLOW_BATCH_BYTES = 1024 * 1024
+
+def get_db_connection(db_path=DB_PATH):
+    """Create a database connection tuned for loading (WAL, 20s busy timeout; see db_profiles)."""
+    return connect(db_path, 'ingestion')
+
+def _hex_ids(prefix, values):
+    """Format an array of integers as IDs of the form f'{prefix}{hex digits}' in one call."""
+    values = np.asarray(values)
+    width = 2 * values.dtype.itemsize
+    hex_ids = np.frombuffer(values.astype(values.dtype.newbyteorder('>')).tobytes().hex().encode('ascii'),
+                            dtype=f'S{width}').astype(str)
+    return prefix + pd.Series(hex_ids)
+
+def _id_text(values):
+    """
+    Format a column as the text its IDs are hashed from. A missing value makes
+    pandas read a whole-number column as float, so whole floats are written
+    without their '.0': 77 reads '77' whether its chunk came out int or float.
+    """
+    text = values.astype(str)
+    if pd.api.types.is_float_dtype(values):
+        whole = values.notna() & (values % 1 == 0)
+        text = text.mask(whole, values[whole].astype('int64').astype(str))
+    return text.astype(object)
+
+def _content_ids(prefix, frame):
+    """
+    Derive deterministic IDs from row contents, so the same record always gets the
+    same ID. Values are hashed as text (see _id_text), so the ID doesn't depend
+    on the dtype pandas happened to infer for a chunk.
+    """
+    text = pd.DataFrame({column: _id_text(frame[column]) for column in frame.columns})
+    hashes = pd.util.hash_pandas_object(text, index=False).to_numpy()
+    return _hex_ids(prefix, hashes)
+
+def _product_ids(names):
+    """Map product names to IDs, e.g. 'Free Range Eggs' -> 'PROD_free_range_eggs'."""
+    return 'PROD_' + names.str.lower().str.replace(' ', '_', regex=False)
+
+def _rows(df):
+    """Iterate over a frame's rows as tuples of native Python values for executemany."""
+    return zip(*(df[column].tolist() for column in df.columns))
+
+def _contact_details(df, rng):
+    """Derive synthetic email addresses and phone numbers for a frame of customers."""
+    email = df['first_name'].str.lower() + '.' + df['last_name'].str.lower() + '@example.com'
     
-    for attempt in range(max_retries):
-        try:
-            # Read the CSV file
-            df = pd.read_csv(csv_file)
-            
-            # Rename columns to match database schema
-            df = df.rename(columns={
-                'First Name': 'first_name',
-                'Last Name': 'last_name',
-                'Street Address': 'address',
-                'Zip Code': 'zip_code',
-                'City': 'city',
-                'State': 'state'
-            })
-            
-            # Generate unique customer IDs and email/phone
-            df['customer_id'] = [f'CUST_{uuid.uuid4().hex[:8]}' for _ in range(len(df))]
-            df['email'] = df.apply(lambda x: f"{x['first_name'].lower()}.{x['last_name'].lower()}@example.com", axis=1)
-            df['phone'] = df.apply(lambda x: f"+1-555-{np.random.randint(100,999)}-{np.random.randint(1000,9999)}", axis=1)
-            
-            # Select and reorder columns to match database schema
-            customers_df = df[['customer_id', 'first_name', 'last_name', 'email', 'phone', 
-                          'address', 'city', 'state', 'zip_code']]
-            
-            # Connect to the database
-            conn = get_db_connection()
+    # One batched draw per phone number block, same ranges as np.random.randint(100, 999) etc.
+    exchange = pd.Series(rng.integers(100, 999, size=len(df)), index=df.index).astype(str)
+    line = pd.Series(rng.integers(1000, 9999, size=len(df)), index=df.index).astype(str)
+    phone = '+1-555-' + exchange + '-' + line
+    
+    return email, phone
+
+def _purchase_date_format(dates):
+    """
+    Detect the Purchase Date format of a feed from a sample of its values: the
+    candidate that parses the most of them wins, earlier candidates on a tie.
+    If none of the sample parses, all of `dates` is tried; if none of that
+    parses either, returns None, and the caller detects from later rows.
+    """
+    values = dates.dropna().astype(str)
+    for sample in (values.head(DATE_FORMAT_SAMPLE_SIZE), values):
+        parsed = [pd.to_datetime(sample, format=f, errors='coerce').notna().sum() for f in PURCHASE_DATE_FORMATS]
+        if max(parsed) > 0:
+            return PURCHASE_DATE_FORMATS[int(np.argmax(parsed))]
+        if len(sample) == len(values):
+            break
+    return None
+
+def _day_numbers(dates, date_format):
+    """
+    Parse a column of dates in one vectorized call into integer day numbers
+    (days since 1970-01-01). Values that don't parse come back as <NA>.
+    """
+    parsed = pd.to_datetime(dates.astype(str), format=date_format, errors='coerce')
+    days = (parsed - pd.Timestamp('1970-01-01')) // pd.Timedelta(days=1)
+    return days.astype('Int64')
+
+def _as_written(df):
+    """
+    Undo the float upcast of whole-number columns that have a missing value in
+    the chunk, so rows are written back out as the CSV had them (71322, not 71322.0).
+    """
+    return df.assign(**{column: _id_text(df[column]).where(df[column].notna())
+                        for column in df.columns if pd.api.types.is_float_dtype(df[column])})
+
+def _reject_rows(df, date_format):
+    """
+    Split raw CSV rows into the ones that can be loaded and the ones that can't,
+    the latter with a reject_reason column. Adds day numbers and integer
+    quantities to the good rows as '_order_day' and '_quantity'.
+    """
+    df = df.reset_index(drop=True)
+    days = _day_numbers(df['Purchase Date'], date_format)
+    quantities = pd.to_numeric(df['Purchase Quantity'], errors='coerce')
+    
+    items = df['Purchase Item']
+    
+    reasons = pd.Series(None, index=df.index, dtype=object)
+    reasons = reasons.mask(items.isna() | (items.astype(str).str.strip() == ''), 'missing Purchase Item')
+    reasons = reasons.mask(quantities.isna() | (quantities % 1 != 0), 'bad Purchase Quantity')
+    reasons = reasons.mask(days.isna(), f'unparseable Purchase Date (expected {date_format})')
+    
+    rejected = reasons.notna()
+    rejects_df = _as_written(df[rejected]).assign(reject_reason=reasons[rejected])
+    df = df[~rejected].assign(_order_day=days[~rejected].astype('int64'),
+                              _quantity=quantities[~rejected].astype('int64'))
+    return df, rejects_df
+
+def _write_rejects(csv_file, rejects_df, rejects_dir=REJECTS_DIR):
+    """Append rejected rows to rejects_dir/<file name>.rejects.csv."""
+    if rejects_df.empty:
+        return
+    os.makedirs(rejects_dir, exist_ok=True)
+    reject_file = os.path.join(rejects_dir, os.path.basename(csv_file) + '.rejects.csv')
+    rejects_df.to_csv(reject_file, mode='a', index=False, header=not os.path.exists(reject_file))
+    print(f"Rejected {len(rejects_df)} rows of {csv_file}, see {reject_file}")
+
+def _purchase_history(values):
+    """
+    Split "Date, First Purchase - Last Purchase" values into sample_date,
+    first_purchase and last_purchase columns of YYYY-MM-DD dates (None where a
+    value is missing or malformed).
+    """
+    parts = values.astype(str).str.extract(PURCHASE_HISTORY_PATTERN)
+    parts.columns = ['sample_date', 'first_purchase', 'last_purchase']
+    for column in parts.columns:
+        dates = pd.to_datetime(parts[column], format='%Y-%m-%d', errors='coerce')
+        parts[column] = dates.dt.strftime('%Y-%m-%d').astype(object).where(dates.notna(), None)
+    return parts
+
+def _transform_chunk(df, rng, date_format='%d-%m-%Y', category='Organic', metrics=None):
+    """
+    Turn a frame of raw CSV rows into customers, orders, order items, products and
+    the customers' CRM engagement attributes (as text; they are encoded on write),
+    plus the raw rows that were rejected because they can't be parsed.
+    With `metrics`, an IngestMetrics, time is split into 'validate' (date parsing
+    and rejects), 'ids' and 'transform'.
+    """
+    with stage(metrics, 'validate', len(df)):
+        df, rejects_df = _reject_rows(df, date_format)
+        
+        # Rename columns to match database schema
+        df = df.rename(columns={
+            'First Name': 'first_name',
+            'Last Name': 'last_name',
+            'Street Address': 'address',
+            'Zip Code': 'zip_code',
+            'City': 'city',
+            'State': 'state'
+        }).reset_index(drop=True)
+    
+    # Derive customer IDs from the customer's details. Order IDs hash the customer
+    # and the purchase, so reloading a row never duplicates it.
+    with stage(metrics, 'ids', len(df)):
+        df['customer_id'] = _content_ids('CUST_', df[['first_name', 'last_name', 'address', 'city', 'state', 'zip_code']])
+        order_ids = _content_ids('ORD_', df[['customer_id', 'Purchase Date', 'Purchase Item', '_quantity']])
+    
+    with stage(metrics, 'transform', len(df)):
+        return _build_tables(df, rng, order_ids, category) + (rejects_df,)
+
+def _build_tables(df, rng, order_ids, category):
+    """Build the customer, order, order item, product and engagement frames of a chunk."""
+    # Synthetic email/phone
+    df['email'], df['phone'] = _contact_details(df, rng)
+    df[['sample_date', 'first_purchase', 'last_purchase']] = _purchase_history(
+        df['Date, First Purchase - Last Purchase'])
+    
+    # Select and reorder columns to match database schema
+    customers_df = df[['customer_id', 'first_name', 'last_name', 'email', 'phone', 
+                  'address', 'city', 'state', 'zip_code', 'sample_date', 'first_purchase', 'last_purchase']]
+    
+    # Create one order and one order item per purchase, column by column
+    order_dates = pd.to_datetime(df['_order_day'], unit='D').dt.strftime('%Y-%m-%d %H:%M:%S')
+    quantities = df['_quantity']
+    product_ids = _product_ids(df['Purchase Item'])
+    
+    orders_df = pd.DataFrame({
+        'order_id': order_ids,
+        'customer_id': df['customer_id'],
+        'order_date': order_dates,
+        'order_day': df['_order_day'],
+        'total_amount': quantities.astype('float64'),  # Using quantity as total amount for simplicity
+        'status': 'Completed'
+    })
+    
+    order_items_df = pd.DataFrame({
+        'order_id': order_ids,
+        'product_id': product_ids,
+        'quantity': quantities,
+        'unit_price': 10.0  # Fixed price for simplicity
+    })
+    
+    # Engagement attributes the feed doesn't have are left empty
+    engagement_df = pd.DataFrame({'customer_id': df['customer_id']})
+    for column in ENGAGEMENT_COLUMNS:
+        values = df[column] if column in df else pd.Series(None, index=df.index, dtype=object)
+        engagement_df[column] = values.astype(str).where(values.notna(), None)
+    
+    products = pd.Series(df['Purchase Item'].unique())
+    products_df = pd.DataFrame({
+        'product_id': _product_ids(products),
+        'name': products,
+        'description': category + ' ' + products,
+        'price': 10.0,
+        'category': category
+    })
+    
+    return customers_df, orders_df, order_items_df, products_df, engagement_df
+
+def _write_engagement(conn, engagement_df, metrics=None):
+    """
+    Encode engagement attributes as codes into their lookup tables, adding values
+    not seen before, and upsert each customer's codes.
+    """
+    cursor = conn.cursor()
+    codes_df = pd.DataFrame({'customer_id': engagement_df['customer_id']})
+    
+    with stage(metrics, 'write_engagement_lookups', len(engagement_df)):
+        for column, (table, code_column) in ENGAGEMENT_LOOKUPS.items():
+            values = engagement_df[column]
+            cursor.executemany(f'''
+                INSERT INTO {table} (name) VALUES (?)
+                ON CONFLICT (name) DO NOTHING
+            ''', ((value,) for value in values.dropna().unique().tolist()))
             
-            try:
-                # Load data into customers table
-                customers_df.to_sql('customers', conn, if_exists='append', index=False)
-                
-                # Create orders from purchase data
-                orders_data = []
-                order_items_data = []
-                
-                for _, row in df.iterrows():
-                    order_id = f'ORD_{uuid.uuid4().hex[:8]}'
-                    order_date = datetime.strptime(row['Purchase Date'], '%d-%m-%Y').strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    # Create order
-                    orders_data.append((
-                        order_id,
-                        row['customer_id'],
-                        order_date,
-                        float(row['Purchase Quantity']),  # Using quantity as total amount for simplicity
-                        'Completed'
-                    ))
-                    
-                    # Create order item
-                    order_items_data.append((
-                        order_id,
-                        f'PROD_{row["Purchase Item"].lower().replace(" ", "_")}',
-                        int(row['Purchase Quantity']),
-                        10.0  # Fixed price for simplicity
-                    ))
-                
-                # Insert orders
-                cursor = conn.cursor()
-                cursor.executemany('''
-                    INSERT INTO orders (order_id, customer_id, order_date, total_amount, status)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', orders_data)
-                
-                # Insert order items
-                cursor.executemany('''
-                    INSERT INTO order_items (order_id, product_id, quantity, unit_price)
-                    VALUES (?, ?, ?, ?)
-                ''', order_items_data)
-                
-                # Insert products
-                products = df['Purchase Item'].unique()
-                products_data = [
-                    (f'PROD_{prod.lower().replace(" ", "_")}', prod, f'Organic {prod}', 10.0, 'Organic')
-                    for prod in products
-                ]
-                
-                cursor.executemany('''
-                    INSERT INTO products (product_id, name, description, price, category)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', products_data)
-                
-                # Commit and close
-                conn.commit()
-                print(f"Loaded {len(df)} customer records into the database")
-                print("Database file created at: data/farm_customers.db")
-                return  # Success, exit the function
-                
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e):
-                    if attempt < max_retries - 1:
-                        print(f"Database is locked. Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
-                        time.sleep(retry_delay)
-                        continue
-                    else:
-                        raise Exception("Failed to access database after multiple attempts. Please ensure no other process is using the database.")
-                else:
-                    raise
-            finally:
-                conn.close()
-                
-        except Exception as e:
-            if attempt < max_retries - 1:
-                print(f"Error occurred: {str(e)}. Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed to load data after {max_retries} attempts: {str(e)}")
-
-def generate_sample_orders():
-    max_retries = 3
-    retry_delay = 2  # seconds
-    
-    for attempt in range(max_retries):
+            codes = values.map(dict(cursor.execute(f'SELECT name, id FROM {table}').fetchall())).astype('Int64')
+            codes_df[code_column] = codes.astype(object).where(codes.notna(), None)
+    
+    with stage(metrics, 'write_engagement', len(codes_df)):
+        cursor.executemany('''
+            INSERT INTO customer_engagement (customer_key, client_type_id, channel_id, frequency_id, outcome_id, profile_id)
+            VALUES ((SELECT id FROM customers WHERE customer_id = ?), ?, ?, ?, ?, ?)
+            ON CONFLICT (customer_key) DO UPDATE SET
+                client_type_id = excluded.client_type_id,
+                channel_id = excluded.channel_id,
+                frequency_id = excluded.frequency_id,
+                outcome_id = excluded.outcome_id,
+                profile_id = excluded.profile_id
+        ''', _rows(codes_df))
+
+def _write_orders(conn, orders_df, order_items_df, metrics=None):
+    """
+    Insert orders and their items and add them to the daily rollups and customer
+    summaries; orders that are already loaded, including those since moved into a
+    monthly partition, are left as they are. The frames carry
+    the TEXT IDs, which are resolved to the INTEGER keys stored in orders and
+    order_items, so their customers and products must be written first.
+    """
+    # Take the write lock before reading the id watermark, so no other writer can
+    # add orders between the read and the insert; a caller may already hold it
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    orders_df, order_items_df = skip_partitioned_orders(conn, orders_df, order_items_df)
+    cursor = conn.cursor()
+    last_order_key = cursor.execute('SELECT IFNULL(MAX(id), 0) FROM orders').fetchone()[0]
+    
+    # Insert orders
+    with stage(metrics, 'write_orders', len(orders_df)):
+        cursor.executemany('''
+            INSERT INTO orders (order_id, customer_key, order_date, order_day, total_amount, status)
+            VALUES (?, (SELECT id FROM customers WHERE customer_id = ?), ?, ?, ?, ?)
+            ON CONFLICT (order_id) DO NOTHING
+        ''', _rows(orders_df))
+    
+    # Insert order items
+    with stage(metrics, 'write_order_items', len(order_items_df)):
+        cursor.executemany('''
+            INSERT INTO order_items (order_key, product_key, quantity, unit_price)
+            VALUES ((SELECT id FROM orders WHERE order_id = ?), (SELECT id FROM products WHERE product_id = ?), ?, ?)
+            ON CONFLICT (order_key, product_key) DO NOTHING
+        ''', _rows(order_items_df))
+    
+    # Roll the orders that are new, not the ones skipped as already loaded, into the
+    # daily totals and their customers' summaries
+    with stage(metrics, 'write_rollups'):
+        update_daily_rollups(cursor, last_order_key)
+        update_customer_summaries(cursor, last_order_key)
+
+def _write_chunk(conn, customers_df, orders_df, order_items_df, products_df, engagement_df=None, sort_keys=False,
+                 metrics=None):
+    """
+    Upsert one transformed chunk; the caller owns the transaction.
+    With sort_keys, rows are written in unique-key order, so the index B-trees are
+    filled left to right instead of at random hash positions (used for bulk loads).
+    With `metrics`, an IngestMetrics, every table's write is timed as its own stage.
+    """
+    if sort_keys:
+        customers_df = customers_df.sort_values('customer_id')
+        orders_df = orders_df.sort_values('order_id')
+        order_items_df = order_items_df.sort_values(['order_id', 'product_id'])
+        if engagement_df is not None:
+            engagement_df = engagement_df.sort_values('customer_id', kind='stable')
+    
+    cursor = conn.cursor()
+    
+    # Upsert customers, refreshing their details but keeping the original email/phone.
+    # The purchase span only ever widens: earliest first purchase, latest last purchase.
+    with stage(metrics, 'write_customers', len(customers_df)):
+        cursor.executemany('''
+            INSERT INTO customers (customer_id, first_name, last_name, email, phone, address, city, state, zip_code,
+                                   sample_date, first_purchase, last_purchase)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (customer_id) DO UPDATE SET
+                first_name = excluded.first_name,
+                last_name = excluded.last_name,
+                address = excluded.address,
+                city = excluded.city,
+                state = excluded.state,
+                zip_code = excluded.zip_code,
+                sample_date = IFNULL(excluded.sample_date, customers.sample_date),
+                first_purchase = MIN(IFNULL(excluded.first_purchase, customers.first_purchase),
+                                     IFNULL(customers.first_purchase, excluded.first_purchase)),
+                last_purchase = MAX(IFNULL(excluded.last_purchase, customers.last_purchase),
+                                    IFNULL(customers.last_purchase, excluded.last_purchase))
+        ''', _rows(customers_df))
+    
+    # Upsert products
+    with stage(metrics, 'write_products', len(products_df)):
+        cursor.executemany('''
+            INSERT INTO products (product_id, name, description, price, category)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (product_id) DO UPDATE SET
+                name = excluded.name,
+                description = excluded.description,
+                price = excluded.price,
+                category = excluded.category
+        ''', _rows(products_df))
+    
+    _write_orders(conn, orders_df, order_items_df, metrics)
+    
+    if engagement_df is not None:
+        _write_engagement(conn, engagement_df, metrics)
+
+class _FileSlice(io.RawIOBase):
+    """Read-only view of the byte range [start, end) of a file."""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+def _read_csv_range(csv_file, columns, start, end, **kwargs):
+    """
+    Parse the data rows in the byte range [start, end) of a CSV whose header is
+    `columns`. Accepts pd.read_csv keyword arguments; with `chunksize` the file
+    stays open until the returned reader is exhausted.
+    """
+    usecols = [c for c in columns if c in CSV_COLUMNS or c in ENGAGEMENT_COLUMNS]
+    reader = io.BufferedReader(_FileSlice(csv_file, start, end))
+    if kwargs.get('chunksize'):
+        return pd.read_csv(reader, header=None, names=columns, usecols=usecols, **kwargs)
+    with reader:
+        return pd.read_csv(reader, header=None, names=columns, usecols=usecols, **kwargs)
+
+def _csv_header(csv_file):
+    """Return a CSV's column names and the byte offset where its data rows start."""
+    with open(csv_file, 'rb') as f:
+        columns = pd.read_csv(io.BytesIO(f.readline()), nrows=0).columns.tolist()
+        return columns, f.tell()
+
+def _complete_rows_end(csv_file, size):
+    """Return the offset just past the last newline, leaving out a partially written last row."""
+    with open(csv_file, 'rb') as f:
+        end = size
+        while end > 0:
+            start = max(end - LEDGER_SAMPLE_BYTES, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline != -1:
+                return start + newline + 1
+            end = start
+    return 0
+
+def _file_fingerprint(csv_file, offset):
+    """Hash the first `offset` bytes of a file by sampling both ends of that range."""
+    digest = hashlib.sha256(str(offset).encode())
+    with open(csv_file, 'rb') as f:
+        digest.update(f.read(min(offset, LEDGER_SAMPLE_BYTES)))
+        f.seek(max(offset - LEDGER_SAMPLE_BYTES, 0))
+        digest.update(f.read(min(offset, LEDGER_SAMPLE_BYTES)))
+    return digest.hexdigest()
+
+def plan_incremental_load(conn, csv_file):
+    """
+    Use the ingestion ledger to work out which rows of a CSV still need loading.
+    Returns a dict with the header `columns` and the byte range [`start`, `end`)
+    of complete rows not loaded yet; `start == end` means there is nothing to do.
+    `date_format` is the Purchase Date format detected by earlier loads, if any.
+    A file that was rewritten rather than appended to is loaded from the top.
+    """
+    source = os.path.abspath(csv_file)
+    stat = os.stat(csv_file)
+    plan = {'source': source, 'file_size': stat.st_size, 'file_mtime': stat.st_mtime_ns,
+            'columns': None, 'start': 0, 'end': 0, 'row_count': 0, 'date_format': None}
+    
+    entry = conn.execute('''
+        SELECT file_hash, byte_offset, row_count, file_size, file_mtime, date_format
+        FROM ingestion_ledger WHERE source = ?
+    ''', (source,)).fetchone()
+    
+    # Unchanged since the last load: skip without reading the file
+    if entry and entry[3] == stat.st_size and entry[4] == stat.st_mtime_ns:
+        plan['start'] = plan['end'] = entry[1]
+        plan['row_count'] = entry[2]
+        plan['date_format'] = entry[5]
+        return plan
+    
+    plan['columns'], data_start = _csv_header(csv_file)
+    plan['end'] = max(_complete_rows_end(csv_file, stat.st_size), data_start)
+    plan['start'] = plan['data_start'] = data_start
+    
+    # Appended since the last load: resume where it stopped
+    if entry and data_start <= entry[1] <= plan['end'] and entry[0] == _file_fingerprint(csv_file, entry[1]):
+        plan['start'] = entry[1]
+        plan['row_count'] = entry[2]
+        plan['date_format'] = entry[5]
+    
+    return plan
+
+def record_incremental_load(conn, plan, rows_loaded, metrics=None):
+    """
+    Move a file's ledger entry forward once the rows of `plan` are written,
+    keeping the Purchase Date format in plan['date_format'] for later loads.
+    """
+    with stage(metrics, 'write_ledger'):
+        conn.execute('''
+            INSERT INTO ingestion_ledger (source, file_hash, byte_offset, row_count, file_size, file_mtime,
+                                          date_format, loaded_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (source) DO UPDATE SET
+                file_hash = excluded.file_hash,
+                byte_offset = excluded.byte_offset,
+                row_count = excluded.row_count,
+                file_size = excluded.file_size,
+                file_mtime = excluded.file_mtime,
+                date_format = excluded.date_format,
+                loaded_at = excluded.loaded_at
+        ''', (plan['source'], _file_fingerprint(plan['source'], plan['end']), plan['end'],
+              plan['row_count'] + rows_loaded, plan['file_size'], plan['file_mtime'], plan['date_format']))
+
+@contextlib.contextmanager
+def bulk_load_session(conn, tables=('customers', 'orders', 'order_items', 'products', 'customer_engagement',
+                                    'customer_order_summary')):
+    """
+    Tune a connection for a large load and put it back afterwards.
+    Inside the block everything runs in one explicit transaction, with
+    synchronous=OFF and a large page cache. Secondary indexes on `tables` are
+    dropped at the start and rebuilt in one pass before the commit; unique
+    indexes stay, since the upserts rely on them. ANALYZE runs once the load has
+    committed, and the original synchronous and cache_size settings are restored
+    even if the load fails.
+    """
+    synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+    cache_size = conn.execute('PRAGMA cache_size').fetchone()[0]
+    
+    placeholders = ', '.join('?' for _ in tables)
+    secondary_indexes = conn.execute(f"""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%'
+          AND tbl_name IN ({placeholders})
+    """, tables).fetchall()
+    
+    conn.commit()
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute(f'PRAGMA cache_size = -{BULK_CACHE_SIZE_KIB}')
+    try:
+        conn.execute('BEGIN')
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Get all customer IDs
-            cursor.execute("SELECT customer_id FROM customers")
-            customer_ids = [row[0] for row in cursor.fetchall()]
-            
-            # Sample products
-            products = [
-                ('P001', 'Organic Tomatoes', 'Fresh organic tomatoes', 4.99, 'Vegetables'),
-                ('P002', 'Organic Lettuce', 'Fresh organic lettuce', 3.99, 'Vegetables'),
-                ('P003', 'Organic Carrots', 'Fresh organic carrots', 2.99, 'Vegetables'),
-                ('P004', 'Organic Apples', 'Fresh organic apples', 5.99, 'Fruits'),
-                ('P005', 'Organic Honey', 'Pure organic honey', 8.99, 'Honey')
-            ]
-            
-            # Insert sample products
-            cursor.executemany('''
-                INSERT INTO products (product_id, name, description, price, category)
-                VALUES (?, ?, ?, ?, ?)
-            ''', products)
-            
-            # Generate sample orders
-            for customer_id in customer_ids[:10]:  # Generate orders for first 10 customers
-                order_id = f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}{customer_id}"
-                order_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                total_amount = 0
-                
-                # Insert order
-                cursor.execute('''
-                    INSERT INTO orders (order_id, customer_id, order_date, total_amount, status)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (order_id, customer_id, order_date, 0, 'Completed'))
-                
-                # Add 1-3 items to each order
-                num_items = np.random.randint(1, 4)
-                for _ in range(num_items):
-                    product = products[np.random.randint(0, len(products))]
-                    quantity = np.random.randint(1, 5)
-                    unit_price = product[3]
-                    total_amount += quantity * unit_price
-                    
-                    cursor.execute('''
-                        INSERT INTO order_items (order_id, product_id, quantity, unit_price)
-                        VALUES (?, ?, ?, ?)
-                    ''', (order_id, product[0], quantity, unit_price))
-                
-                # Update order total
-                cursor.execute('''
-                    UPDATE orders SET total_amount = ? WHERE order_id = ?
-                ''', (total_amount, order_id))
-            
+            for name, _ in secondary_indexes:
+                conn.execute(f'DROP INDEX "{name}"')
+            yield conn
+            for _, sql in secondary_indexes:
+                conn.execute(sql)
             conn.commit()
-            print("Generated sample orders and products")
-            return  # Success, exit the function
+        except BaseException:
+            conn.rollback()
+            raise
+        
+        # Refresh planner statistics, sampling large indexes rather than scanning them
+        conn.execute('PRAGMA analysis_limit = 1000')
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.execute(f'PRAGMA synchronous = {synchronous}')
+        conn.execute(f'PRAGMA cache_size = {cache_size}')
+
+def _timed_chunks(chunks, metrics):
+    """Iterate over chunks of a CSV, timing the parsing of each one as the 'parse' stage."""
+    chunks = iter(chunks)
+    while True:
+        with stage(metrics, 'parse'):
+            df = next(chunks, None)
+        if df is None:
+            return
+        if metrics:
+            metrics.count('parse', rows=len(df))
+        yield df
+
+def _load_planned_rows(writer, csv_file, plan, rng, chunksize=None, bulk=False, use_cache=False, report_chunks=True,
+                       metrics=None):
+    """
+    Load the rows a plan from plan_incremental_load covers and advance the ledger.
+    Chunks are parsed here and written by `writer`, a DatabaseWriter, so parsing
+    the next chunk overlaps with writing the last one. Returns the number of rows
+    loaded once they are written. Other arguments are as for load_customer_data;
+    with bulk, rows are written in key order and the writer is expected to run a
+    bulk_load_session. With `metrics`, an IngestMetrics, every stage is timed.
+    """
+    # Read the new rows of the CSV, either whole or as a stream of chunks. Only
+    # the columns we load are parsed; the long free-text columns are skipped.
+    with stage(metrics, 'parse', nbytes=plan['end'] - plan['start']):
+        if use_cache and plan['start'] == plan['data_start'] and plan['end'] == plan['file_size']:
+            chunks = read_csv_cached(csv_file, usecols=CSV_COLUMNS + ENGAGEMENT_COLUMNS, chunksize=chunksize)
+            if not chunksize:
+                chunks = [chunks]
+        elif chunksize:
+            chunks = _read_csv_range(csv_file, plan['columns'], plan['start'], plan['end'], chunksize=chunksize)
+        else:
+            chunks = [_read_csv_range(csv_file, plan['columns'], plan['start'], plan['end'])]
+    
+    total_rows = 0
+    chunk = None
+    
+    for chunk_number, df in enumerate(_timed_chunks(chunks, metrics), start=1):
+        chunk_start = time.perf_counter()
+        # The date format is detected once per file, from the first chunk with a
+        # date that parses, and kept in the ledger. A chunk without one has
+        # nothing to load under any format, so every candidate rejects it alike.
+        plan['date_format'] = plan['date_format'] or _purchase_date_format(df['Purchase Date'])
+        customers_df, orders_df, order_items_df, products_df, engagement_df, rejects_df = _transform_chunk(
+            df, rng, plan['date_format'] or PURCHASE_DATE_FORMATS[0], metrics=metrics)
+        
+        # A chunk is queued once the next one is parsed, so the last can be written
+        # in one transaction with the ledger entry. Blocks while the writer is
+        # behind, so at most a few chunks are held in memory.
+        if chunk:
+            with stage(metrics, 'queue_wait'):
+                writer.submit(_write_chunk, *chunk)
+        chunk = (customers_df, orders_df, order_items_df, products_df, engagement_df, bulk, metrics)
+        with stage(metrics, 'write_rejects', len(rejects_df)):
+            _write_rejects(csv_file, rejects_df)
+        total_rows += len(customers_df)
+        
+        if chunksize and report_chunks:
+            elapsed = time.perf_counter() - chunk_start
+            peak_rss = _peak_rss_mb()
+            print(f"Chunk {chunk_number}: {len(df)} rows in {elapsed:.2f}s "
+                  f"({len(df) / max(elapsed, 1e-9):,.0f} rows/sec), "
+                  f"peak RSS {'n/a' if peak_rss is None else f'{peak_rss:.1f} MB'}")
+    
+    # The ledger only advances with the last chunk, once every earlier one is in;
+    # a failed load is simply re-run, and the upserts make the replayed rows harmless
+    with stage(metrics, 'queue_wait'):
+        last_write = writer.submit(_write_last_chunk, chunk, plan, total_rows, metrics)
+    with stage(metrics, 'drain'):
+        last_write.result()
+    return total_rows
+
+def _write_last_chunk(conn, chunk, plan, rows_loaded, metrics=None):
+    """Write a load's last chunk, if any, and advance the ledger in the same transaction."""
+    if chunk:
+        _write_chunk(conn, *chunk)
+    record_incremental_load(conn, plan, rows_loaded, metrics)
+
+def load_customer_data(csv_file, chunksize=None, seed=None, db_path=DB_PATH, bulk=False, use_cache=False,
+                       metrics_file=METRICS_FILE, stage_report=False):
+    """
+    Load a customer CSV into the database.
+    Loads are incremental and idempotent: IDs are derived from row contents, rows
+    are upserted, and the ingestion ledger records how far each file has been
+    loaded, so re-running only processes rows appended since the last run.
+    Writes go through a DatabaseWriter, so a transiently locked database delays
+    a single chunk rather than restarting the load.
+    Args:
+        csv_file: Path to the customer CSV
+        chunksize: If set, stream the file in chunks of this many rows, writing and
+            committing each chunk separately so memory use stays flat regardless of
+            file size. Rows/sec and peak RSS are reported after every chunk.
+        seed: Seed for the generator behind the synthetic phone numbers, so runs
+            can be reproduced
+        db_path: Database to load into
+        bulk: Use bulk-load mode (see bulk_load_session) for large loads
+        use_cache: Read a full load from the file's columnar snapshot (see
+            csv_cache), parsing the CSV only the first time a given version of
+            it is loaded. Incremental loads of appended rows read the CSV.
+        metrics_file: Append a JSON report of the run, with wall/CPU time, rows,
+            bytes and peak memory of every stage (see ingest_metrics), to this
+            file. None turns the report off.
+        stage_report: Also print the per-stage timings
+    """
+    init_db(db_path)
+    rng = np.random.default_rng(seed)
+    
+    with contextlib.closing(get_db_connection(db_path)) as conn:
+        plan = plan_incremental_load(conn, csv_file)
+    if plan['start'] >= plan['end']:
+        print(f"{csv_file} has no new rows since the last load ({plan['row_count']} rows loaded)")
+        return
+    
+    metrics = IngestMetrics(os.path.abspath(csv_file), db_path=db_path, chunksize=chunksize, bulk=bulk,
+                            use_cache=use_cache)
+    
+    # In bulk mode the whole load is one transaction on a tuned connection
+    load_start = time.perf_counter()
+    with DatabaseWriter(lambda: get_db_connection(db_path), session=bulk_load_session if bulk else None,
+                        commit_timer=lambda: metrics.stage('commit')) as writer:
+        total_rows = _load_planned_rows(writer, csv_file, plan, rng, chunksize=chunksize,
+                                        bulk=bulk, use_cache=use_cache, metrics=metrics)
+    metrics.finish()
+    
+    elapsed = time.perf_counter() - load_start
+    print(f"Loaded {total_rows} customer records into the database "
+          f"({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    print(f"Database file created at: {db_path}")
+    
+    report = metrics.report(total_rows, plan['end'] - plan['start'])
+    if stage_report:
+        print_report(report)
+    if metrics_file:
+        write_report(report, metrics_file)
+
+def follow_customer_data(csv_file, db_path=DB_PATH, batch_bytes=FOLLOW_BATCH_BYTES, max_latency=2.0,
+                         poll_interval=0.5, chunksize=10_000, seed=None, idle_timeout=None):
+    """
+    Follow a customer CSV that is being appended to, like `tail -f`, and load new
+    rows as they arrive. Following starts where the ingestion ledger says the last
+    load stopped, and only complete lines are read; a partially written last line
+    waits for its newline. New rows are loaded in micro-batches, the last chunk of
+    each committed together with the ledger entry, so the dashboard sees them
+    straight away and a batch interrupted before its commit is loaded again.
+    Args:
+        csv_file: Path to the customer CSV
+        db_path: Database to load into
+        batch_bytes: Load as soon as this many bytes of new rows are waiting
+        max_latency: Otherwise load once new rows have waited this many seconds
+        poll_interval: Seconds between checks of the file for new rows
+        chunksize: Parse large backlogs in chunks of this many rows
+        seed: Seed for the synthetic data generator
+        idle_timeout: Stop after this many seconds without new rows (by default,
+            follow until interrupted)
+    """
+    init_db(db_path)
+    rng = np.random.default_rng(seed)
+    writer = DatabaseWriter(lambda: get_db_connection(db_path))
+    
+    print(f"Following {csv_file} (Ctrl+C to stop)")
+    last_activity = time.monotonic()
+    pending_since = last_activity - max_latency  # Load any backlog straight away
+    try:
+        while True:
+            try:
+                plan = writer.call(plan_incremental_load, csv_file)
+            except FileNotFoundError:
+                # The file is being rotated; wait for it to reappear
+                plan = {'start': 0, 'end': 0}
+            now = time.monotonic()
+            
+            if plan['start'] < plan['end']:
+                last_activity = now
+                pending_since = pending_since or now
+                if plan['end'] - plan['start'] >= batch_bytes or now - pending_since >= max_latency:
+                    batch_start = time.perf_counter()
+                    rows = _load_planned_rows(writer, csv_file, plan, rng, chunksize=chunksize, report_chunks=False)
+                    print(f"Loaded {rows} new rows in {time.perf_counter() - batch_start:.2f}s "
+                          f"({plan['row_count'] + rows} rows loaded from {csv_file})")
+                    pending_since = None
+                    continue  # More rows may have arrived during the load
+            elif idle_timeout is not None and now - last_activity >= idle_timeout:
+                break
             
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                if attempt < max_retries - 1:
-                    print(f"Database is locked. Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    raise Exception("Failed to access database after multiple attempts. Please ensure no other process is using the database.")
-            else:
-                raise
-        except Exception as e:
-            if attempt < max_retries - 1:
-                print(f"Error occurred: {str(e)}. Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed to generate sample orders after {max_retries} attempts: {str(e)}")
-        finally:
-            if 'conn' in locals():
-                conn.close()
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+    print(f"Stopped following {csv_file}")
+
+# Sample products the order generator adds to the catalogue
+SAMPLE_PRODUCTS = [
+    ('P001', 'Organic Tomatoes', 'Fresh organic tomatoes', 4.99, 'Vegetables'),
+    ('P002', 'Organic Lettuce', 'Fresh organic lettuce', 3.99, 'Vegetables'),
+    ('P003', 'Organic Carrots', 'Fresh organic carrots', 2.99, 'Vegetables'),
+    ('P004', 'Organic Apples', 'Fresh organic apples', 5.99, 'Fruits'),
+    ('P005', 'Organic Honey', 'Pure organic honey', 8.99, 'Honey')
+]
+
+def _seasonal_day_weights(days):
+    """
+    Relative order volume for each day: a yearly cycle peaking in early summer, a
+    bump over the November/December holidays and busier weekends.
+    """
+    day_of_year = days.dayofyear.to_numpy()
+    weights = 1 + 0.3 * np.sin(2 * np.pi * (day_of_year - 80) / 365.25)
+    weights *= np.where((days.month == 12) | ((days.month == 11) & (days.day >= 20)), 1.4, 1.0)
+    weights *= np.where(days.dayofweek >= 5, 1.25, 1.0)
+    return weights / weights.sum()
+
+def _generate_order_batch(rng, first_order, n_orders, customer_ids, customer_weights,
+                          product_ids, product_prices, product_weights, days, day_weights, run_token):
+    """
+    Draw one batch of synthetic orders and their items as arrays.
+    Basket sizes are 1 + Poisson(1.5) items and quantities 1 + Poisson(1); a
+    product drawn twice for the same order becomes one line with the summed
+    quantity. Order totals are the sums of their lines.
+    """
+    # Orders: who, when, and how many items
+    customers = rng.choice(len(customer_ids), size=n_orders, p=customer_weights)
+    order_days = days[rng.choice(len(days), size=n_orders, p=day_weights)]
+    seconds = np.clip(rng.normal(17 * 3600, 3 * 3600, size=n_orders), 8 * 3600, 22 * 3600).astype('int64')
+    order_dates = (order_days + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S')
+    order_day_numbers = (order_days - pd.Timestamp('1970-01-01')) // pd.Timedelta(days=1)
+    basket_sizes = 1 + rng.poisson(1.5, size=n_orders)
+    
+    # Items: expand orders by basket size, then draw products and quantities
+    item_orders = np.repeat(np.arange(n_orders), basket_sizes)
+    items = pd.DataFrame({
+        'order': item_orders,
+        'product': rng.choice(len(product_ids), size=len(item_orders), p=product_weights),
+        'quantity': 1 + rng.poisson(1.0, size=len(item_orders))
+    }).groupby(['order', 'product'], as_index=False, sort=True)['quantity'].sum()
+    
+    unit_prices = product_prices[items['product'].to_numpy()]
+    totals = np.bincount(items['order'].to_numpy(), weights=items['quantity'].to_numpy() * unit_prices,
+                         minlength=n_orders)
+    
+    order_ids = _hex_ids(f'ORD_{run_token}_', np.arange(first_order, first_order + n_orders, dtype=np.uint32))
+    orders_df = pd.DataFrame({
+        'order_id': order_ids,
+        'customer_id': customer_ids[customers],
+        'order_date': order_dates,
+        'order_day': order_day_numbers,
+        'total_amount': np.round(totals, 2),
+        'status': 'Completed'
+    })
+    order_items_df = pd.DataFrame({
+        'order_id': order_ids.to_numpy()[items['order'].to_numpy()],
+        'product_id': product_ids[items['product'].to_numpy()],
+        'quantity': items['quantity'].to_numpy(),
+        'unit_price': unit_prices
+    })
+    return orders_df, order_items_df
+
+def generate_sample_orders(n_orders=1000, seed=None, db_path=DB_PATH, start_date=None, end_date=None,
+                           batch_size=100_000, bulk=False):
+    """
+    Generate synthetic orders for all customers, for load testing.
+    Customers get gamma-distributed activity levels, products a skewed popularity,
+    and order dates follow _seasonal_day_weights. Everything is drawn with NumPy
+    from one seeded generator and written in batches with the totals computed up
+    front. Re-running with the same seed and arguments produces the same orders,
+    which the upserts then skip.
+    Args:
+        n_orders: Number of orders to generate
+        seed: Seed for the random generator
+        db_path: Database to write to
+        start_date: First order date (defaults to a year before end_date)
+        end_date: Last order date (defaults to today)
+        batch_size: Orders generated and written per batch
+        bulk: Write in bulk-load mode (see bulk_load_session)
+    """
+    end_date = pd.Timestamp(end_date or datetime.now()).normalize()
+    start_date = pd.Timestamp(start_date).normalize() if start_date else end_date - pd.Timedelta(days=365)
+    days = pd.date_range(start_date, end_date, freq='D')
+    rng = np.random.default_rng(seed)
+    
+    with DatabaseWriter(lambda: get_db_connection(db_path), session=bulk_load_session if bulk else None) as writer:
+        # Insert sample products
+        writer.call(lambda conn: conn.executemany('''
+            INSERT INTO products (product_id, name, description, price, category)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (product_id) DO NOTHING
+        ''', SAMPLE_PRODUCTS))
+        
+        # Orders are spread over every customer and every product in the catalogue
+        customer_ids = writer.call(
+            lambda conn: pd.read_sql_query("SELECT customer_id FROM customers", conn))['customer_id'].to_numpy()
+        products = writer.call(lambda conn: pd.read_sql_query("SELECT product_id, price FROM products", conn))
+        if len(customer_ids) == 0:
+            raise Exception("No customers to generate orders for; load customer data first")
+        
+        # Order IDs start with a token for this run. With a seed, the token covers
+        # everything the draws depend on, so an identical re-run reproduces (and
+        # skips) the same orders, while any other run gets fresh IDs.
+        if seed is None:
+            run_token = os.urandom(4).hex()
+        else:
+            fingerprint = hashlib.sha256(repr((seed, n_orders, batch_size, str(start_date), str(end_date))).encode())
+            fingerprint.update(pd.util.hash_pandas_object(pd.Series(customer_ids), index=False).to_numpy().tobytes())
+            fingerprint.update(pd.util.hash_pandas_object(products, index=False).to_numpy().tobytes())
+            run_token = fingerprint.hexdigest()[:8]
+        
+        customer_weights = rng.gamma(1.0, size=len(customer_ids))
+        customer_weights /= customer_weights.sum()
+        product_weights = 1 / (1 + rng.permutation(len(products))) ** 0.8
+        product_weights /= product_weights.sum()
+        day_weights = _seasonal_day_weights(days)
+        
+        generated_items = 0
+        start = time.perf_counter()
+        for first_order in range(0, n_orders, batch_size):
+            orders_df, order_items_df = _generate_order_batch(
+                rng, first_order, min(batch_size, n_orders - first_order),
+                customer_ids, customer_weights,
+                products['product_id'].to_numpy(), products['price'].to_numpy(dtype='float64'), product_weights,
+                days, day_weights, run_token)
+            writer.submit(_write_orders, orders_df, order_items_df)
+            generated_items += len(order_items_df)
+        writer.flush()
+    
+    elapsed = time.perf_counter() - start
+    print(f"Generated {n_orders} sample orders with {generated_items} items for {len(customer_ids)} customers "
+          f"in {elapsed:.2f}s ({n_orders / max(elapsed, 1e-9):,.0f} orders/sec)")
 
 if __name__ == "__main__":
     # Ensure data directory exists
     os.makedirs('data', exist_ok=True)
     
-    # Load customer data from CSV
-    load_customer_data('final_synthetic_organic_farm_customers.csv')
+    parser = argparse.ArgumentParser(description='Load customer data into the database.')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream the CSV in chunks of this many rows')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the synthetic data generator')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Load in one transaction with tuned pragmas and deferred indexes')
+    parser.add_argument('--cache', action='store_true',
+                        help='Read full loads from the columnar CSV snapshot cache')
+    parser.add_argument('--follow', action='store_true',
+                        help='Keep running and load rows as they are appended to the CSV')
+    parser.add_argument('--stage-report', action='store_true',
+                        help='Print how long each ingestion stage took')
+    args = parser.parse_args()
     
-    # Generate sample orders and products
-    generate_sample_orders() 
\ No newline at end of file
+    if args.follow:
+        # Load the backlog, then keep loading rows as they are appended
+        follow_customer_data('final_synthetic_organic_farm_customers.csv', seed=args.seed)
+    else:
+        # Load customer data from CSV
+        load_customer_data('final_synthetic_organic_farm_customers.csv', chunksize=args.chunksize,
+                           seed=args.seed, bulk=args.bulk, use_cache=args.cache, stage_report=args.stage_report)
+        
+        # Generate sample orders and products
+        generate_sample_orders(seed=args.seed)
@@ -0,0 +1,91 @@
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+
+from db_profiles import connect
+
+# Idle connections kept open per database and profile; busier moments open extra
+# connections that are closed again when returned
+POOL_SIZE = 4
+
+class ConnectionPool:
+    """
+    Open connections to one database, lent out to one thread at a time and kept
+    open between queries, so each keeps its parsed schema, prepared statements
+    and page cache. The most recently returned connection is lent first, as its
+    cache is the warmest. A connection that fails a health check when taken out
+    of the pool, or was opened on a file that has since been replaced (such as an
+    older snapshot), is closed and replaced.
+    """
+
+    def __init__(self, db_path, profile='default', size=POOL_SIZE):
+        self.db_path = db_path
+        self.profile = profile
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _file_id(self):
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+    def _open(self):
+        # Identify the file before connecting: if it is replaced in between, the
+        # connection is only reopened once more than needed
+        file_id = self._file_id()
+        # Connections move between threads, but only ever one thread uses one at a time
+        return connect(self.db_path, self.profile, check_same_thread=False), file_id
+
+    @staticmethod
+    def _healthy(conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection for the block; it goes back to the pool afterwards."""
+        try:
+            conn, file_id = self._idle.get_nowait()
+        except queue.Empty:
+            conn, file_id = self._open()
+        else:
+            if file_id != self._file_id() or not self._healthy(conn):
+                conn.close()
+                conn, file_id = self._open()
+
+        try:
+            yield conn
+        finally:
+            try:
+                # Never hand on an open transaction: it would pin an old snapshot
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put_nowait((conn, file_id))
+            except (queue.Full, sqlite3.Error):
+                conn.close()
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+                conn.close()
+            except queue.Empty:
+                return
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path, profile='default'):
+    """Return the process-wide pool for a database and profile, creating it on first use."""
+    with _pools_lock:
+        key = (db_path, profile)
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_path, profile)
+        return _pools[key]
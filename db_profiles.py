@@ -0,0 +1,87 @@
+import os
+import sqlite3
+from pathlib import Path
+from urllib.parse import urlencode
+
+# Connection settings per workload: 'timeout' is how many seconds to wait for a
+# lock, 'mode' and 'immutable' are URI parameters the file is opened with,
+# 'max_age' makes DatabaseManager read from a snapshot of the database refreshed
+# when older than that many seconds (see db_snapshot), and every other setting is
+# a PRAGMA run on each new connection. Any setting can be overridden through the
+# environment as SQLITE_<PROFILE>_<SETTING>, e.g. SQLITE_DASHBOARD_MMAP_SIZE=0
+# turns memory mapping off for the dashboard.
+PROFILES = {
+    # sqlite3.connect's own defaults, as a baseline
+    'default': {},
+    # Read-heavy dashboard: open the file read-only, map it into memory, keep a
+    # large page cache and sorting/grouping temp tables in RAM, and refuse writes
+    'dashboard': {
+        'timeout': 5,
+        'mode': 'ro',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # Negative: KiB rather than pages
+        'temp_store': 'MEMORY',
+        'query_only': 1,
+    },
+    # Loaders: WAL so the dashboard keeps reading during a load, fsync only at
+    # checkpoints, and a long busy timeout for other writers
+    'ingestion': {
+        'timeout': 20,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    # Dashboard reading a snapshot that no other connection writes: immutable, so
+    # SQLite skips locking and change detection altogether, and loads never wait
+    # on the dashboard or it on them. Data lags by up to max_age seconds, and the
+    # read that finds the snapshot stale copies the database first.
+    'snapshot': {
+        'max_age': 60,
+        'immutable': 1,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+        'query_only': 1,
+    },
+}
+
+# Settings passed as URI parameters when opening the file rather than as PRAGMAs
+URI_PARAMETERS = ('mode', 'immutable')
+
+def _parse(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+def profile_settings(profile):
+    """Return a profile's settings with any SQLITE_<PROFILE>_<SETTING> environment overrides applied."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown connection profile. Must be one of: {', '.join(PROFILES)}")
+    settings = dict(PROFILES[profile])
+    prefix = f'SQLITE_{profile.upper()}_'
+    for name, value in os.environ.items():
+        if name.startswith(prefix):
+            settings[name[len(prefix):].lower()] = _parse(value)
+    return settings
+
+def connect(db_path, profile='default', **kwargs):
+    """Open a connection to db_path tuned with a named profile; kwargs go to sqlite3.connect."""
+    settings = profile_settings(profile)
+    settings.pop('max_age', None)
+    if 'timeout' in settings:
+        kwargs.setdefault('timeout', settings.pop('timeout'))
+    uri_parameters = {name: settings.pop(name) for name in URI_PARAMETERS if name in settings}
+    if uri_parameters:
+        db_path = f'{Path(db_path).resolve().as_uri()}?{urlencode(uri_parameters)}'
+        kwargs['uri'] = True
+    conn = sqlite3.connect(db_path, **kwargs)
+    # query_only last, so it doesn't block the settings before it
+    for name, value in sorted(settings.items(), key=lambda item: item[0] == 'query_only'):
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
@@ -1,14 +1,49 @@
 import sqlite3
 import os
 
-def init_db():
-    # Create database directory if it doesn't exist
-    os.makedirs('data', exist_ok=True)
-    
-    # Connect to SQLite database (creates it if it doesn't exist)
-    conn = sqlite3.connect('data/farm_customers.db')
-    cursor = conn.cursor()
+# CRM engagement columns of the customer CSVs: CSV column -> (lookup table, code column)
+ENGAGEMENT_LOOKUPS = {
+    'Client Type': ('client_types', 'client_type_id'),
+    'Model of Communication': ('communication_channels', 'channel_id'),
+    'Frequency': ('engagement_frequencies', 'frequency_id'),
+    'Outcome': ('engagement_outcomes', 'outcome_id'),
+    'Customer Profile': ('customer_profiles', 'profile_id')
+}
+
+# julianday('1970-01-01'): subtracting it turns a julianday() into days since the Unix epoch
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+def _create_unique_index(cursor, table, columns, merge_quantity=False):
+    """
+    Create a unique index on a table's natural key, first removing duplicate rows
+    left behind by loads that ran before the index existed.
+    """
+    index_name = f"idx_{table}_{'_'.join(columns)}_unique"
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,))
+    if cursor.fetchone():
+        return
     
+    key = ', '.join(columns)
+    if merge_quantity:
+        # Fold the quantities of duplicate order lines into the first one
+        cursor.execute(f'''
+        UPDATE {table} SET quantity = (
+            SELECT SUM(d.quantity) FROM {table} d
+            WHERE {' AND '.join(f'd.{c} = {table}.{c}' for c in columns)}
+        )
+        WHERE id IN (SELECT MIN(id) FROM {table} GROUP BY {key} HAVING COUNT(*) > 1)
+        ''')
+    cursor.execute(f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {key})")
+    cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON {table} ({key})")
+
+def _add_missing_columns(cursor, table, columns):
+    """Add columns introduced after a table was first created to an existing database."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, column_type in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+def _create_base_tables(cursor):
     # Create customers table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS customers (
@@ -64,11 +99,390 @@ def init_db():
         FOREIGN KEY (product_id) REFERENCES products (product_id)
     )
     ''')
+
+def _add_natural_keys(cursor):
+    # Create ingestion ledger: how far each source file has been loaded
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ingestion_ledger (
+        source TEXT PRIMARY KEY,
+        file_hash TEXT,
+        byte_offset INTEGER,
+        row_count INTEGER,
+        file_size INTEGER,
+        file_mtime INTEGER,
+        loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Natural keys are unique so that re-running an ingest upserts instead of appending
+    _create_unique_index(cursor, 'customers', ['customer_id'])
+    _create_unique_index(cursor, 'orders', ['order_id'])
+    _create_unique_index(cursor, 'products', ['product_id'])
+    _create_unique_index(cursor, 'order_items', ['order_id', 'product_id'], merge_quantity=True)
+
+def _add_engagement_tables(cursor):
+    # Create lookup tables for the CRM engagement columns: one row and small integer code per distinct value
+    for table, _ in ENGAGEMENT_LOOKUPS.values():
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''')
+    
+    # Create customer_engagement table: each customer's CRM attributes as lookup codes
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customer_engagement (
+        customer_id TEXT PRIMARY KEY,
+        client_type_id INTEGER REFERENCES client_types (id),
+        channel_id INTEGER REFERENCES communication_channels (id),
+        frequency_id INTEGER REFERENCES engagement_frequencies (id),
+        outcome_id INTEGER REFERENCES engagement_outcomes (id),
+        profile_id INTEGER REFERENCES customer_profiles (id),
+        FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
+    )
+    ''')
+    
+    # Segment and outcome filters compare these codes
+    for column in ('client_type_id', 'channel_id', 'frequency_id', 'outcome_id'):
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_customer_engagement_{column} ON customer_engagement ({column})')
+
+def _add_purchase_history(cursor):
+    # Purchase history parsed from "Date, First Purchase - Last Purchase", as YYYY-MM-DD
+    _add_missing_columns(cursor, 'customers', [('sample_date', 'DATE'), ('first_purchase', 'DATE'),
+                                               ('last_purchase', 'DATE')])
+    
+    # Recency and tenure queries range-scan these
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_customers_first_purchase ON customers (first_purchase)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_customers_last_purchase ON customers (last_purchase)')
+
+def _add_join_indexes(cursor):
+    # Per-customer order lookups and aggregates (top customers, customer orders)
+    # are answered from the index alone, including an order_date range filter
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_orders_customer_id_order_date
+    ON orders (customer_id, order_date, total_amount)
+    ''')
+    
+    # Date range filters and daily revenue trends
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders (order_date, total_amount)')
+    
+    # Product sales join order_items from products; lookups by order_id use the
+    # unique (order_id, product_id) index, and products the unique product_id one
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_items_product_id ON order_items (product_id)')
+    
+    # Give the query planner statistics for the new indexes
+    cursor.execute('ANALYZE')
+
+def _use_integer_keys(cursor):
+    """
+    Rebuild orders, order_items and customer_engagement to reference customers,
+    orders and products by their INTEGER id instead of repeating the TEXT IDs.
+    The external IDs are kept once, in their own table.
+    """
+    for table in ('orders', 'order_items', 'customer_engagement'):
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+    
+    # Orders reference their customer by customers.id
+    cursor.execute('''
+    CREATE TABLE orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT NOT NULL,
+        customer_key INTEGER REFERENCES customers (id),
+        order_date TIMESTAMP,
+        total_amount REAL,
+        status TEXT
+    )
+    ''')
+    cursor.execute('''
+    INSERT INTO orders (id, order_id, customer_key, order_date, total_amount, status)
+    SELECT o.id, o.order_id, c.id, o.order_date, o.total_amount, o.status
+    FROM orders_old o
+    LEFT JOIN customers c ON c.customer_id = o.customer_id
+    ''')
+    
+    # Order items are two integers and a payload, clustered by order: WITHOUT ROWID
+    # stores each row in the primary key B-tree, so an order's items sit together
+    cursor.execute('''
+    CREATE TABLE order_items (
+        order_key INTEGER NOT NULL REFERENCES orders (id),
+        product_key INTEGER NOT NULL REFERENCES products (id),
+        quantity INTEGER,
+        unit_price REAL,
+        PRIMARY KEY (order_key, product_key)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    INSERT INTO order_items (order_key, product_key, quantity, unit_price)
+    SELECT o.id, p.id, oi.quantity, oi.unit_price
+    FROM order_items_old oi
+    JOIN orders o ON o.order_id = oi.order_id
+    JOIN products p ON p.product_id = oi.product_id
+    ''')
+    
+    # Engagement codes keyed by customers.id, which is also the table's rowid
+    cursor.execute('''
+    CREATE TABLE customer_engagement (
+        customer_key INTEGER PRIMARY KEY REFERENCES customers (id),
+        client_type_id INTEGER REFERENCES client_types (id),
+        channel_id INTEGER REFERENCES communication_channels (id),
+        frequency_id INTEGER REFERENCES engagement_frequencies (id),
+        outcome_id INTEGER REFERENCES engagement_outcomes (id),
+        profile_id INTEGER REFERENCES customer_profiles (id)
+    )
+    ''')
+    cursor.execute('''
+    INSERT INTO customer_engagement (customer_key, client_type_id, channel_id, frequency_id, outcome_id, profile_id)
+    SELECT c.id, e.client_type_id, e.channel_id, e.frequency_id, e.outcome_id, e.profile_id
+    FROM customer_engagement_old e
+    JOIN customers c ON c.customer_id = e.customer_id
+    ''')
+    
+    for table in ('orders', 'order_items', 'customer_engagement'):
+        cursor.execute(f'DROP TABLE {table}_old')
+    
+    # Recreate the indexes on the new keys
+    cursor.execute('CREATE UNIQUE INDEX idx_orders_order_id_unique ON orders (order_id)')
+    cursor.execute('''
+    CREATE INDEX idx_orders_customer_key_order_date
+    ON orders (customer_key, order_date, total_amount)
+    ''')
+    cursor.execute('CREATE INDEX idx_orders_order_date ON orders (order_date, total_amount)')
+    cursor.execute('CREATE INDEX idx_order_items_product_key ON order_items (product_key)')
+    for column in ('client_type_id', 'channel_id', 'frequency_id', 'outcome_id'):
+        cursor.execute(f'CREATE INDEX idx_customer_engagement_{column} ON customer_engagement ({column})')
+    cursor.execute('ANALYZE')
+
+def _add_order_day(cursor):
+    """
+    Add orders.order_day, the order's date as whole days since 1970-01-01, and
+    move the date indexes onto it. Date ranges become integer comparisons on an
+    index instead of string comparisons on timestamps, and grouping by day is
+    grouping by an integer. order_date stays for display.
+    """
+    cursor.execute('ALTER TABLE orders ADD COLUMN order_day INTEGER')
+    cursor.execute(f'''
+    UPDATE orders
+    SET order_day = CAST(julianday(order_date) - {UNIX_EPOCH_JULIAN_DAY} AS INTEGER)
+    WHERE order_date IS NOT NULL
+    ''')
+    
+    cursor.execute('DROP INDEX IF EXISTS idx_orders_customer_key_order_date')
+    cursor.execute('DROP INDEX IF EXISTS idx_orders_order_date')
+    cursor.execute('''
+    CREATE INDEX idx_orders_customer_key_order_day
+    ON orders (customer_key, order_day, total_amount)
+    ''')
+    cursor.execute('CREATE INDEX idx_orders_order_day ON orders (order_day, total_amount)')
+    cursor.execute('ANALYZE')
+
+def update_daily_rollups(cursor, after_order_key=0):
+    """
+    Add the orders with an id above `after_order_key`, and their items, to the
+    daily rollups. Loaders call this in the transaction that inserted the orders,
+    passing the highest orders.id from before the insert, so every order is
+    counted exactly once. Sales stay under the category their product had when
+    they were rolled up.
+    """
+    cursor.execute('''
+    INSERT INTO daily_sales (order_day, orders, revenue)
+    SELECT o.order_day, COUNT(*), IFNULL(SUM(o.total_amount), 0)
+    FROM orders o
+    WHERE o.id > ? AND o.order_day IS NOT NULL
+    GROUP BY o.order_day
+    ON CONFLICT (order_day) DO UPDATE SET
+        orders = orders + excluded.orders,
+        revenue = revenue + excluded.revenue
+    ''', (after_order_key,))
     
-    # Commit the changes and close the connection
+    # An order has one line per product, so counting lines counts distinct orders
+    cursor.execute('''
+    INSERT INTO daily_product_sales (order_day, product_key, orders, quantity, revenue)
+    SELECT o.order_day, oi.product_key, COUNT(*), SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+    FROM orders o
+    JOIN order_items oi ON oi.order_key = o.id
+    WHERE o.id > ? AND o.order_day IS NOT NULL
+    GROUP BY o.order_day, oi.product_key
+    ON CONFLICT (order_day, product_key) DO UPDATE SET
+        orders = orders + excluded.orders,
+        quantity = quantity + excluded.quantity,
+        revenue = revenue + excluded.revenue
+    ''', (after_order_key,))
+    cursor.execute('''
+    INSERT INTO daily_category_sales (order_day, category, orders, quantity, revenue)
+    SELECT o.order_day, p.category, COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+    FROM orders o
+    JOIN order_items oi ON oi.order_key = o.id
+    JOIN products p ON p.id = oi.product_key
+    WHERE o.id > ? AND o.order_day IS NOT NULL AND p.category IS NOT NULL
+    GROUP BY o.order_day, p.category
+    ON CONFLICT (order_day, category) DO UPDATE SET
+        orders = orders + excluded.orders,
+        quantity = quantity + excluded.quantity,
+        revenue = revenue + excluded.revenue
+    ''', (after_order_key,))
+
+def _add_daily_rollups(cursor):
+    """
+    Add per-day sales totals overall, by product and by category, so the
+    dashboard's sales queries read one row per day instead of every order.
+    """
+    cursor.execute('''
+    CREATE TABLE daily_sales (
+        order_day INTEGER PRIMARY KEY,
+        orders INTEGER NOT NULL,
+        revenue REAL NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE daily_product_sales (
+        order_day INTEGER NOT NULL,
+        product_key INTEGER NOT NULL REFERENCES products (id),
+        orders INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        revenue REAL NOT NULL,
+        PRIMARY KEY (order_day, product_key)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE daily_category_sales (
+        order_day INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        orders INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        revenue REAL NOT NULL,
+        PRIMARY KEY (order_day, category)
+    ) WITHOUT ROWID
+    ''')
+    update_daily_rollups(cursor)
+
+def update_customer_summaries(cursor, after_order_key=0):
+    """
+    Add the orders with an id above `after_order_key` to their customers' order
+    summaries, in the transaction that inserted them (see update_daily_rollups).
+    """
+    cursor.execute('''
+    INSERT INTO customer_order_summary (customer_key, total_orders, total_spent, first_order_day, last_order_day)
+    SELECT o.customer_key, COUNT(*), IFNULL(SUM(o.total_amount), 0), MIN(o.order_day), MAX(o.order_day)
+    FROM orders o
+    WHERE o.id > ? AND o.customer_key IS NOT NULL
+    GROUP BY o.customer_key
+    ON CONFLICT (customer_key) DO UPDATE SET
+        total_orders = total_orders + excluded.total_orders,
+        total_spent = total_spent + excluded.total_spent,
+        first_order_day = MIN(IFNULL(first_order_day, excluded.first_order_day),
+                              IFNULL(excluded.first_order_day, first_order_day)),
+        last_order_day = MAX(IFNULL(last_order_day, excluded.last_order_day),
+                             IFNULL(excluded.last_order_day, last_order_day))
+    ''', (after_order_key,))
+
+def _add_customer_summaries(cursor):
+    """
+    Add each customer's order count, total spent and first/last order day, kept
+    up to date by the loaders, so top customers are read off an index on
+    total_spent instead of aggregating every order.
+    """
+    cursor.execute('''
+    CREATE TABLE customer_order_summary (
+        customer_key INTEGER PRIMARY KEY REFERENCES customers (id),
+        total_orders INTEGER NOT NULL,
+        total_spent REAL NOT NULL,
+        first_order_day INTEGER,
+        last_order_day INTEGER
+    )
+    ''')
+    cursor.execute('CREATE INDEX idx_customer_order_summary_total_spent ON customer_order_summary (total_spent)')
+    update_customer_summaries(cursor)
+
+def _add_order_partitions(cursor):
+    """
+    Add the registry of monthly order partitions. order_partitions.py moves old
+    months of orders and order_items into read-only tables of their own, and
+    queries read only the partitions overlapping their date range.
+    """
+    cursor.execute('''
+    CREATE TABLE order_partitions (
+        month TEXT PRIMARY KEY,
+        first_day INTEGER NOT NULL,
+        end_day INTEGER NOT NULL,
+        orders INTEGER NOT NULL,
+        order_items INTEGER NOT NULL,
+        partitioned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def _add_ledger_date_format(cursor):
+    # The Purchase Date format detected for each source, reused by later loads of it
+    _add_missing_columns(cursor, 'ingestion_ledger', [('date_format', 'TEXT')])
+
+# Schema migrations, applied in order. Never edit or reorder a released step; add
+# a new one. Steps 1-5 are idempotent, so databases created before schema_version
+# existed start at version 0 and are brought up to date by replaying them all.
+MIGRATIONS = [
+    (1, 'Create customers, orders, products and order_items', _create_base_tables),
+    (2, 'Add the ingestion ledger and unique natural keys', _add_natural_keys),
+    (3, 'Add dictionary-encoded CRM engagement tables', _add_engagement_tables),
+    (4, 'Add parsed purchase history to customers', _add_purchase_history),
+    (5, 'Add covering indexes for joins and order_date ranges', _add_join_indexes),
+    (6, 'Reference customers, orders and products by INTEGER keys', _use_integer_keys),
+    (7, 'Store order dates as INTEGER day numbers for range scans', _add_order_day),
+    (8, 'Add daily sales rollups by product and category', _add_daily_rollups),
+    (9, 'Add per-customer order summaries', _add_customer_summaries),
+    (10, 'Add the registry of monthly order partitions', _add_order_partitions),
+    (11, 'Record the detected Purchase Date format of each source', _add_ledger_date_format),
+]
+
+def _schema_version(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    return cursor.execute('SELECT IFNULL(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+def migrate(conn):
+    """
+    Bring a database's schema up to the latest version, applying every pending
+    migration in its own transaction. Returns the names of the migrations applied.
+    """
+    cursor = conn.cursor()
+    current = _schema_version(cursor)
     conn.commit()
-    conn.close()
+    
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the write lock
+            if _schema_version(cursor) >= version:
+                conn.rollback()
+                continue
+            step(cursor)
+            cursor.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(name)
+    return applied
+
+def init_db(db_path='data/farm_customers.db'):
+    """Create the database if needed and migrate it to the latest schema version."""
+    # Create database directory if it doesn't exist
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    
+    # Connect to SQLite database (creates it if it doesn't exist)
+    conn = sqlite3.connect(db_path)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
-    init_db()
+    for name in init_db():
+        print(f"Applied migration: {name}")
     print("Database initialized successfully!") 
\ No newline at end of file
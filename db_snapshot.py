@@ -0,0 +1,77 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from db_profiles import connect
+
+# Seconds a snapshot is served before the next read refreshes it
+SNAPSHOT_MAX_AGE = 60
+
+_refresh_lock = threading.Lock()
+
+def snapshot_path(db_path):
+    """Return where a database's snapshot is kept: next to it, as <name>.snapshot<ext>."""
+    root, ext = os.path.splitext(db_path)
+    return f'{root}.snapshot{ext}'
+
+def _age(path):
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return float('inf')
+
+def refresh_snapshot(db_path):
+    """
+    Copy a database to its snapshot with the online backup API and switch to the
+    copy in one rename, so readers see either the old snapshot or the new one,
+    never a partial copy. Connections still open on the old snapshot keep
+    reading it until they close. Returns the snapshot's path.
+    """
+    path = snapshot_path(db_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(path) or '.')
+    os.close(fd)
+    try:
+        # Under WAL, the copy is one read transaction, which loads don't wait on
+        source = connect(db_path, 'dashboard')
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target)
+            # Immutable readers must find no WAL to look for
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+            source.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+def current_snapshot(db_path, max_age=SNAPSHOT_MAX_AGE):
+    """
+    Return the path of a database's snapshot, first refreshing it if it is
+    missing or older than `max_age` seconds. While one thread refreshes, the
+    others keep reading the snapshot there is rather than waiting.
+    """
+    path = snapshot_path(db_path)
+    if _age(path) < max_age:
+        return path
+    if not _refresh_lock.acquire(blocking=not os.path.exists(path)):
+        return path
+    try:
+        if _age(path) >= max_age:
+            refresh_snapshot(db_path)
+    finally:
+        _refresh_lock.release()
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Refresh the read-only snapshot the dashboard reads from.')
+    parser.add_argument('db_path', help='Database to snapshot')
+    args = parser.parse_args()
+
+    print(f"Snapshot written to {refresh_snapshot(args.db_path)}")
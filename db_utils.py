@@ -1,11 +1,28 @@
-import sqlite3
 import pandas as pd
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+from db_pool import get_pool
+from db_profiles import profile_settings
+from db_setup import ENGAGEMENT_LOOKUPS
+from db_snapshot import current_snapshot
+from order_partitions import order_sources
+
+def _day_number(value: date) -> int:
+    """Return a date or datetime as whole days since 1970-01-01, like orders.order_day."""
+    return value.toordinal() - date(1970, 1, 1).toordinal()
 
 class DatabaseManager:
-    def __init__(self, db_path: str = 'data/farm_customers.db'):
+    def __init__(self, db_path: str = 'data/farm_customers.db', profile: str = 'dashboard'):
+        """
+        Args:
+            db_path: Path to the SQLite database
+            profile: Connection profile from db_profiles.PROFILES
+        """
         self.db_path = db_path
+        self.profile = profile
+        # Seconds a snapshot is read before it is refreshed, for snapshot profiles
+        self.snapshot_max_age = profile_settings(profile).get('max_age')
         self.start_date = None
         self.end_date = None
 
@@ -14,7 +31,14 @@ class DatabaseManager:
         self.end_date = end_date
 
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """
+        Borrow a pooled connection for a `with` block; it stays open for later
+        queries. Snapshot profiles read the database's current snapshot instead.
+        """
+        db_path = self.db_path
+        if self.snapshot_max_age is not None:
+            db_path = current_snapshot(db_path, self.snapshot_max_age)
+        return get_pool(db_path, self.profile).connection()
 
     def execute_query(self, query: str, params: tuple = None) -> List[tuple]:
         with self.get_connection() as conn:
@@ -29,105 +53,128 @@ class DatabaseManager:
         with self.get_connection() as conn:
             return pd.read_sql_query(query, conn, params=params)
 
+    def execute_orders_query_df(self, query: str, params: tuple = None) -> pd.DataFrame:
+        """
+        Run a query over orders whose `{orders}` and `{order_lines}` (orders joined
+        to their items) stand for the live tables plus only the monthly partitions
+        overlapping the date filter.
+        """
+        first_day = _day_number(self.start_date) if self.start_date else None
+        end_day = _day_number(self.end_date) + 1 if self.end_date else None
+        with self.get_connection() as conn:
+            orders, order_lines = order_sources(conn, first_day, end_day)
+            return pd.read_sql_query(query.format(orders=orders, order_lines=order_lines), conn, params=params)
+
     def get_customer_orders(self, customer_id: str) -> pd.DataFrame:
         query = """
         SELECT o.order_id, o.order_date, o.total_amount, o.status,
-               oi.product_id, p.name as product_name, oi.quantity, oi.unit_price
-        FROM orders o
-        JOIN order_items oi ON o.order_id = oi.order_id
-        JOIN products p ON oi.product_id = p.product_id
-        WHERE o.customer_id = ?
+               p.product_id, p.name as product_name, o.quantity, o.unit_price
+        FROM {order_lines} o
+        JOIN products p ON o.product_key = p.id
+        WHERE o.customer_key = (SELECT id FROM customers WHERE customer_id = ?)
         """
         params = [customer_id]
         
         if self.start_date:
-            query += " AND o.order_date >= ?"
-            params.append(self.start_date.strftime('%Y-%m-%d'))
+            query += " AND o.order_day >= ?"
+            params.append(_day_number(self.start_date))
         if self.end_date:
-            query += " AND o.order_date <= ?"
-            params.append(self.end_date.strftime('%Y-%m-%d'))
+            query += " AND o.order_day < ?"
+            params.append(_day_number(self.end_date) + 1)
             
         query += " ORDER BY o.order_date DESC"
-        return self.execute_query_df(query, tuple(params))
+        return self.execute_orders_query_df(query, tuple(params))
 
     def get_top_customers(self, limit: int = 10) -> pd.DataFrame:
+        if not (self.start_date or self.end_date):
+            # All-time totals: take the top rows off the summaries' total_spent
+            # index, then look up just those customers
+            query = """
+            SELECT c.customer_id, c.first_name, c.last_name,
+                   s.total_orders, s.total_spent,
+                   date(s.last_order_day * 86400, 'unixepoch') as last_order_date
+            FROM (
+                SELECT customer_key, total_orders, total_spent, last_order_day
+                FROM customer_order_summary
+                ORDER BY total_spent DESC
+                LIMIT ?
+            ) s
+            JOIN customers c ON c.id = s.customer_key
+            ORDER BY s.total_spent DESC
+            """
+            return self.execute_query_df(query, (limit,))
+        
         query = """
         SELECT c.customer_id, c.first_name, c.last_name,
-               COUNT(o.order_id) as total_orders,
+               COUNT(o.id) as total_orders,
                SUM(o.total_amount) as total_spent,
-               MAX(o.order_date) as last_order_date
+               date(MAX(o.order_day) * 86400, 'unixepoch') as last_order_date
         FROM customers c
-        LEFT JOIN orders o ON c.customer_id = o.customer_id
+        LEFT JOIN {orders} o ON c.id = o.customer_key
+        WHERE 1=1
         """
         
         params = []
-        if self.start_date or self.end_date:
-            query += " WHERE 1=1"
-            if self.start_date:
-                query += " AND o.order_date >= ?"
-                params.append(self.start_date.strftime('%Y-%m-%d'))
-            if self.end_date:
-                query += " AND o.order_date <= ?"
-                params.append(self.end_date.strftime('%Y-%m-%d'))
+        if self.start_date:
+            query += " AND o.order_day >= ?"
+            params.append(_day_number(self.start_date))
+        if self.end_date:
+            query += " AND o.order_day < ?"
+            params.append(_day_number(self.end_date) + 1)
         
         query += """
-        GROUP BY c.customer_id
+        GROUP BY c.id
         ORDER BY total_spent DESC
         LIMIT ?
         """
         params.append(limit)
-        return self.execute_query_df(query, tuple(params))
+        return self.execute_orders_query_df(query, tuple(params))
 
     def get_product_sales(self) -> pd.DataFrame:
         query = """
         SELECT p.product_id, p.name, p.category,
-               COUNT(DISTINCT o.order_id) as times_ordered,
-               SUM(oi.quantity) as total_quantity,
-               SUM(oi.quantity * oi.unit_price) as total_revenue
-        FROM products p
-        JOIN order_items oi ON p.product_id = oi.product_id
-        JOIN orders o ON oi.order_id = o.order_id
+               SUM(s.orders) as times_ordered,
+               SUM(s.quantity) as total_quantity,
+               SUM(s.revenue) as total_revenue
+        FROM daily_product_sales s
+        JOIN products p ON p.id = s.product_key
+        WHERE 1=1
         """
         
         params = []
-        if self.start_date or self.end_date:
-            query += " WHERE 1=1"
-            if self.start_date:
-                query += " AND o.order_date >= ?"
-                params.append(self.start_date.strftime('%Y-%m-%d'))
-            if self.end_date:
-                query += " AND o.order_date <= ?"
-                params.append(self.end_date.strftime('%Y-%m-%d'))
+        if self.start_date:
+            query += " AND s.order_day >= ?"
+            params.append(_day_number(self.start_date))
+        if self.end_date:
+            query += " AND s.order_day < ?"
+            params.append(_day_number(self.end_date) + 1)
         
         query += """
-        GROUP BY p.product_id
+        GROUP BY p.id
         ORDER BY total_revenue DESC
         """
         return self.execute_query_df(query, tuple(params) if params else None)
 
     def get_sales_by_category(self) -> pd.DataFrame:
         query = """
-        SELECT p.category,
-               COUNT(DISTINCT o.order_id) as total_orders,
-               SUM(oi.quantity) as total_quantity,
-               SUM(oi.quantity * oi.unit_price) as total_revenue
-        FROM products p
-        JOIN order_items oi ON p.product_id = oi.product_id
-        JOIN orders o ON oi.order_id = o.order_id
+        SELECT s.category,
+               SUM(s.orders) as total_orders,
+               SUM(s.quantity) as total_quantity,
+               SUM(s.revenue) as total_revenue
+        FROM daily_category_sales s
+        WHERE 1=1
         """
         
         params = []
-        if self.start_date or self.end_date:
-            query += " WHERE 1=1"
-            if self.start_date:
-                query += " AND o.order_date >= ?"
-                params.append(self.start_date.strftime('%Y-%m-%d'))
-            if self.end_date:
-                query += " AND o.order_date <= ?"
-                params.append(self.end_date.strftime('%Y-%m-%d'))
+        if self.start_date:
+            query += " AND s.order_day >= ?"
+            params.append(_day_number(self.start_date))
+        if self.end_date:
+            query += " AND s.order_day < ?"
+            params.append(_day_number(self.end_date) + 1)
         
         query += """
-        GROUP BY p.category
+        GROUP BY s.category
         ORDER BY total_revenue DESC
         """
         return self.execute_query_df(query, tuple(params) if params else None)
@@ -186,51 +233,130 @@ class DatabaseManager:
 
     def get_sales_trends(self, days: int = 30) -> pd.DataFrame:
         query = """
-        SELECT DATE(o.order_date) as date, SUM(o.total_amount) as revenue
-        FROM orders o
+        SELECT date(s.order_day * 86400, 'unixepoch') as date, s.revenue
+        FROM daily_sales s
         WHERE 1=1
         """
         
         params = []
         if self.start_date:
-            query += " AND o.order_date >= ?"
-            params.append(self.start_date.strftime('%Y-%m-%d'))
+            query += " AND s.order_day >= ?"
+            params.append(_day_number(self.start_date))
         elif days:
-            query += " AND o.order_date >= date('now', ?)"
-            params.append(f'-{days} days')
+            query += " AND s.order_day >= ?"
+            params.append(_day_number(datetime.now()) - days)
             
         if self.end_date:
-            query += " AND o.order_date <= ?"
-            params.append(self.end_date.strftime('%Y-%m-%d'))
+            query += " AND s.order_day < ?"
+            params.append(_day_number(self.end_date) + 1)
         
-        query += """
-        GROUP BY DATE(o.order_date)
-        ORDER BY date
-        """
+        query += " ORDER BY s.order_day"
         return self.execute_query_df(query, tuple(params) if params else None)
 
     def get_all_customers(self) -> pd.DataFrame:
+        if not (self.start_date or self.end_date):
+            # All-time totals come from the summaries, without touching orders
+            query = """
+            SELECT c.*,
+                   IFNULL(s.total_orders, 0) as total_orders,
+                   s.total_spent,
+                   date(s.last_order_day * 86400, 'unixepoch') as last_order_date
+            FROM customers c
+            LEFT JOIN customer_order_summary s ON s.customer_key = c.id
+            """
+            return self.execute_query_df(query)
+        
         query = """
         SELECT c.*, 
-               COUNT(o.order_id) as total_orders,
+               COUNT(o.id) as total_orders,
                SUM(o.total_amount) as total_spent,
-               MAX(o.order_date) as last_order_date
+               date(MAX(o.order_day) * 86400, 'unixepoch') as last_order_date
         FROM customers c
-        LEFT JOIN orders o ON c.customer_id = o.customer_id
+        LEFT JOIN {orders} o ON c.id = o.customer_key
+        WHERE 1=1
         """
         
         params = []
-        if self.start_date or self.end_date:
-            query += " WHERE 1=1"
-            if self.start_date:
-                query += " AND o.order_date >= ?"
-                params.append(self.start_date.strftime('%Y-%m-%d'))
-            if self.end_date:
-                query += " AND o.order_date <= ?"
-                params.append(self.end_date.strftime('%Y-%m-%d'))
+        if self.start_date:
+            query += " AND o.order_day >= ?"
+            params.append(_day_number(self.start_date))
+        if self.end_date:
+            query += " AND o.order_day < ?"
+            params.append(_day_number(self.end_date) + 1)
         
-        query += " GROUP BY c.customer_id"
-        return self.execute_query_df(query, tuple(params) if params else None)
+        query += " GROUP BY c.id"
+        return self.execute_orders_query_df(query, tuple(params))
+
+    def get_customer_recency(self, as_of: datetime = None) -> pd.DataFrame:
+        """
+        Days since each customer's last purchase and how long they have been buying,
+        read from the purchase history stored on the customer (no orders join).
+        The date filter applies to the last purchase.
+        """
+        as_of = (as_of or datetime.now()).strftime('%Y-%m-%d')
+        query = """
+        SELECT c.customer_id, c.first_name, c.last_name,
+               c.first_purchase, c.last_purchase,
+               CAST(julianday(?) - julianday(c.last_purchase) AS INTEGER) as recency_days,
+               CAST(julianday(c.last_purchase) - julianday(c.first_purchase) AS INTEGER) as tenure_days
+        FROM customers c
+        WHERE c.last_purchase IS NOT NULL
+        """
+        params = [as_of]
+
+        if self.start_date:
+            query += " AND c.last_purchase >= ?"
+            params.append(self.start_date.strftime('%Y-%m-%d'))
+        if self.end_date:
+            query += " AND c.last_purchase <= ?"
+            params.append(self.end_date.strftime('%Y-%m-%d'))
+
+        query += " ORDER BY c.last_purchase DESC"
+        return self.execute_query_df(query, tuple(params))
+
+    def get_engagement_breakdown(self, dimension: str = 'Outcome', filters: Dict[str, str] = None) -> pd.DataFrame:
+        """
+        Count customers, orders and spend by one CRM engagement attribute.
+        Args:
+            dimension: The attribute to group by (Client Type, Model of Communication,
+                Frequency, Outcome or Customer Profile)
+            filters: Attribute values to restrict to, e.g. {'Client Type': 'Frequent'}
+        """
+        filters = filters or {}
+        for attribute in [dimension, *filters]:
+            if attribute not in ENGAGEMENT_LOOKUPS:
+                raise ValueError(f"Invalid engagement attribute. Must be one of: {', '.join(ENGAGEMENT_LOOKUPS)}")
+        
+        table, code_column = ENGAGEMENT_LOOKUPS[dimension]
+        query = f"""
+        SELECT l.name as value,
+               COUNT(DISTINCT e.customer_key) as customers,
+               COUNT(o.id) as total_orders,
+               SUM(o.total_amount) as total_spent
+        FROM customer_engagement e
+        JOIN {table} l ON l.id = e.{code_column}
+        LEFT JOIN {{orders}} o ON o.customer_key = e.customer_key
+        WHERE 1=1
+        """
+        
+        # Filters resolve each value to its code once, then compare integers
+        params = []
+        for attribute, value in filters.items():
+            filter_table, filter_column = ENGAGEMENT_LOOKUPS[attribute]
+            query += f" AND e.{filter_column} = (SELECT id FROM {filter_table} WHERE name = ?)"
+            params.append(value)
+        if self.start_date:
+            query += " AND o.order_day >= ?"
+            params.append(_day_number(self.start_date))
+        if self.end_date:
+            query += " AND o.order_day < ?"
+            params.append(_day_number(self.end_date) + 1)
+        
+        query += """
+        GROUP BY l.id
+        ORDER BY customers DESC
+        """
+        return self.execute_orders_query_df(query, tuple(params) if params else None)
 
     def get_all_products(self) -> pd.DataFrame:
         query = """
@@ -241,22 +367,24 @@ class DatabaseManager:
 
     def get_all_orders(self) -> pd.DataFrame:
         query = """
-        SELECT o.*, oi.product_id, oi.quantity, oi.unit_price
-        FROM orders o
-        JOIN order_items oi ON o.order_id = oi.order_id
+        SELECT o.id, o.order_id, c.customer_id, o.order_date, o.total_amount, o.status,
+               p.product_id, o.quantity, o.unit_price
+        FROM {order_lines} o
+        JOIN products p ON o.product_key = p.id
+        LEFT JOIN customers c ON o.customer_key = c.id
         """
         
         params = []
         if self.start_date or self.end_date:
             query += " WHERE 1=1"
             if self.start_date:
-                query += " AND o.order_date >= ?"
-                params.append(self.start_date.strftime('%Y-%m-%d'))
+                query += " AND o.order_day >= ?"
+                params.append(_day_number(self.start_date))
             if self.end_date:
-                query += " AND o.order_date <= ?"
-                params.append(self.end_date.strftime('%Y-%m-%d'))
+                query += " AND o.order_day < ?"
+                params.append(_day_number(self.end_date) + 1)
         
-        return self.execute_query_df(query, tuple(params) if params else None)
+        return self.execute_orders_query_df(query, tuple(params) if params else None)
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,157 @@
+import contextlib
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+# Give up on a batch that still finds the database locked after this many seconds
+MAX_LOCK_WAIT = 60.0
+
+# First pause before retrying a batch that hit a lock; doubled on every retry, up to 1s
+LOCK_RETRY_DELAY = 0.01
+
+_STOP = object()
+
+class DatabaseWriter:
+    """
+    A thread that owns a database's write connection and runs write batches
+    handed to it over a bounded queue, one at a time and in submission order.
+    Producers only parse and transform: submit() blocks while `max_pending`
+    batches are waiting, so a slow disk throttles them instead of piling up
+    memory. Batches that hit "database is locked" are rolled back and retried
+    on their own after a few milliseconds, without touching the rest of the load.
+
+    With `session`, a context manager factory such as bulk_load_session, the
+    writer runs every batch inside session(conn) and commits when the session
+    ends. Otherwise every batch is its own transaction, committed as it finishes.
+    """
+
+    def __init__(self, connect, session=None, max_pending=4, commit_timer=None):
+        """
+        Args:
+            connect: Callable returning the write connection; called on the writer thread
+            session: Optional context manager factory wrapping the writer's whole lifetime
+            max_pending: Number of batches that may wait in the queue
+            commit_timer: Optional context manager factory wrapped around every
+                commit and the end of the session, e.g. to time them
+        """
+        self._connect = connect
+        self._session = session
+        self._commit_timer = commit_timer or contextlib.nullcontext
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._stopped = False
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            self._thread.join()
+            raise self._error
+
+    def submit(self, fn, *args):
+        """
+        Queue fn(conn, *args) to run on the writer thread and return a Future for
+        its result. Blocks while the queue is full; raises at once if an earlier
+        batch failed, so producers stop instead of parsing for nothing.
+        """
+        if self._error:
+            raise self._error
+        future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def call(self, fn, *args):
+        """Run fn(conn, *args) on the writer thread and wait for its result."""
+        return self.submit(fn, *args).result()
+
+    def flush(self):
+        """Wait until every batch submitted so far has been written."""
+        self.call(lambda conn: None)
+
+    def close(self, abort=False):
+        """
+        Write the remaining batches, end the session and close the connection.
+        With abort, queued batches are dropped and the session is ended as failed,
+        so a bulk load rolls back. Raises the error of a failed batch, if any.
+        """
+        if abort and not self._error:
+            self._error = RuntimeError('Load aborted')
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._error and not abort:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(abort=exc_type is not None)
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        try:
+            session = self._session(conn) if self._session else None
+            if session:
+                session.__enter__()
+            try:
+                self._drain(conn)
+            finally:
+                if session:
+                    error = self._error
+                    with self._commit_timer():
+                        if error:
+                            session.__exit__(type(error), error, error.__traceback__)
+                        else:
+                            session.__exit__(None, None, None)
+        except BaseException as e:
+            self._error = self._error or e
+            if not self._stopped:
+                self._drain(conn)  # Fail whatever is still queued
+        finally:
+            conn.close()
+
+    def _drain(self, conn):
+        """Run queued batches until told to stop; after a failure, fail the rest."""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._stopped = True
+                return
+            future, fn, args = item
+            if self._error:
+                future.set_exception(self._error)
+                continue
+            try:
+                future.set_result(self._write(conn, fn, args))
+            except BaseException as e:
+                self._error = e
+                future.set_exception(e)
+
+    def _write(self, conn, fn, args):
+        """Run one batch, retrying it alone while the database is locked."""
+        delay = LOCK_RETRY_DELAY
+        deadline = time.monotonic() + MAX_LOCK_WAIT
+        while True:
+            try:
+                result = fn(conn, *args)
+                if not self._session:
+                    with self._commit_timer():
+                        conn.commit()
+                return result
+            except sqlite3.OperationalError as e:
+                # Inside a session the batch shares its transaction with earlier
+                # ones, so it can't be rolled back and retried on its own
+                if 'database is locked' not in str(e) or self._session or time.monotonic() >= deadline:
+                    raise
+                conn.rollback()
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
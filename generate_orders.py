@@ -0,0 +1,26 @@
+import argparse
+
+from data_ingestion import DB_PATH, generate_sample_orders
+from db_setup import init_db
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic orders for load testing the dashboard.')
+    parser.add_argument('--orders', type=int, default=1_000_000,
+                        help='Number of orders to generate')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the random generator; the same seed gives the same orders')
+    parser.add_argument('--db', default=DB_PATH,
+                        help='Database to write to')
+    parser.add_argument('--start-date', default=None,
+                        help='First order date, YYYY-MM-DD (defaults to a year before the end date)')
+    parser.add_argument('--end-date', default=None,
+                        help='Last order date, YYYY-MM-DD (defaults to today)')
+    parser.add_argument('--batch-size', type=int, default=100_000,
+                        help='Orders generated and written per batch')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Write in one transaction with tuned pragmas and deferred indexes')
+    args = parser.parse_args()
+
+    init_db(args.db)
+    generate_sample_orders(args.orders, seed=args.seed, db_path=args.db, start_date=args.start_date,
+                           end_date=args.end_date, batch_size=args.batch_size, bulk=args.bulk)
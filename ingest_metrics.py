@@ -0,0 +1,131 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Every instrumented run appends one JSON line to this file
+METRICS_FILE = 'data/ingest_metrics.jsonl'
+
+def _peak_rss_mb():
+    """Return the peak resident set size of this process in MB (None if unavailable)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _rate(amount, seconds):
+    return round(amount / seconds) if amount and seconds > 0 else None
+
+class IngestMetrics:
+    """
+    Wall time, CPU time, rows, bytes and peak memory of each stage of one
+    ingestion run. Stages may run on different threads (parsing on the loader,
+    writes on the DatabaseWriter); CPU time is measured per thread, so each
+    stage is charged only for its own work. A stage entered several times
+    accumulates, e.g. once per chunk.
+    """
+
+    def __init__(self, source, **options):
+        self.source = source
+        self.options = options
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._wall_end = self._cpu_end = None
+
+    def _stage_totals(self, name):
+        return self.stages.setdefault(name, {'calls': 0, 'rows': 0, 'bytes': 0, 'wall_seconds': 0.0,
+                                             'cpu_seconds': 0.0, 'peak_rss_mb': None})
+
+    def count(self, name, rows=0, nbytes=0):
+        """Add rows and bytes to a stage without timing anything."""
+        with self._lock:
+            totals = self._stage_totals(name)
+            totals['rows'] += rows
+            totals['bytes'] += nbytes
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=0, nbytes=0):
+        """Time the block as part of stage `name`, which handled `rows` rows and `nbytes` bytes."""
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            peak_rss = _peak_rss_mb()
+            with self._lock:
+                totals = self._stage_totals(name)
+                totals['calls'] += 1
+                totals['rows'] += rows
+                totals['bytes'] += nbytes
+                totals['wall_seconds'] += wall
+                totals['cpu_seconds'] += cpu
+                if peak_rss is not None:
+                    totals['peak_rss_mb'] = max(totals['peak_rss_mb'] or 0, peak_rss)
+
+    def finish(self):
+        """Stop the run's clocks."""
+        self._wall_end = time.perf_counter()
+        self._cpu_end = time.process_time()
+
+    def report(self, rows, nbytes):
+        """Return the run as a JSON-serializable dict, given the rows and bytes it loaded."""
+        if self._wall_end is None:
+            self.finish()
+        wall = self._wall_end - self._wall_start
+        peak_rss = _peak_rss_mb()
+        with self._lock:
+            stages = {
+                name: {**totals,
+                       'wall_seconds': round(totals['wall_seconds'], 4),
+                       'cpu_seconds': round(totals['cpu_seconds'], 4),
+                       'peak_rss_mb': totals['peak_rss_mb'] and round(totals['peak_rss_mb'], 1),
+                       'rows_per_sec': _rate(totals['rows'], totals['wall_seconds']),
+                       'bytes_per_sec': _rate(totals['bytes'], totals['wall_seconds'])}
+                for name, totals in self.stages.items()
+            }
+        return {
+            'source': self.source,
+            'started_at': self.started_at,
+            'options': self.options,
+            'rows': rows,
+            'bytes': nbytes,
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(self._cpu_end - self._cpu_start, 4),
+            'rows_per_sec': _rate(rows, wall),
+            'bytes_per_sec': _rate(nbytes, wall),
+            'peak_rss_mb': peak_rss and round(peak_rss, 1),
+            'stages': stages
+        }
+
+def print_report(report):
+    """Print a per-stage timing table for a report from IngestMetrics.report()."""
+    print(f"{'stage':<26}{'calls':>7}{'rows':>10}{'wall s':>10}{'cpu s':>10}{'rows/sec':>12}{'share':>8}")
+    for name, totals in report['stages'].items():
+        share = totals['wall_seconds'] / report['wall_seconds'] if report['wall_seconds'] else 0
+        rate = totals['rows_per_sec']
+        print(f"{name:<26}{totals['calls']:>7}{totals['rows']:>10}{totals['wall_seconds']:>10.3f}"
+              f"{totals['cpu_seconds']:>10.3f}{'-' if rate is None else f'{rate:,}':>12}{share:>8.0%}")
+    peak_rss = report['peak_rss_mb']
+    print(f"Total: {report['rows']} rows, {report['bytes']:,} bytes in {report['wall_seconds']:.3f}s "
+          f"({report['cpu_seconds']:.3f}s CPU), peak RSS {'n/a' if peak_rss is None else f'{peak_rss} MB'}")
+
+def write_report(report, metrics_file=METRICS_FILE):
+    """Append a run report as one line of JSON to metrics_file."""
+    os.makedirs(os.path.dirname(metrics_file) or '.', exist_ok=True)
+    with open(metrics_file, 'a') as f:
+        f.write(json.dumps(report) + '\n')
+
+def stage(metrics, name, rows=0, nbytes=0):
+    """metrics.stage(...), or a no-op when metrics is None."""
+    return metrics.stage(name, rows, nbytes) if metrics else contextlib.nullcontext()
@@ -0,0 +1,185 @@
+import argparse
+import contextlib
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from data_ingestion import (DATE_FORMAT_SAMPLE_SIZE, PURCHASE_DATE_FORMATS, _purchase_date_format, _read_csv_range,
+                            _transform_chunk, _write_chunk, _write_rejects, bulk_load_session, get_db_connection,
+                            plan_incremental_load, record_incremental_load)
+from db_setup import init_db
+
+# The vertical customer feeds shipped with the repo
+VERTICAL_FILES = [
+    'final_synthetic_organic_farm_customers.csv',
+    'pizza_shop_customers_final.csv',
+    'beauty_salon_customers.csv',
+    'medspa_customers.csv',
+    'property_management_customers.csv'
+]
+
+def vertical_name(csv_file):
+    """Derive a vertical label from a feed's file name, e.g. 'medspa_customers.csv' -> 'Medspa'."""
+    stem = os.path.splitext(os.path.basename(csv_file))[0]
+    words = [w for w in stem.split('_') if w not in ('final', 'synthetic', 'customers')]
+    return ' '.join(words).title()
+
+def resolve_sources(sources):
+    """Expand a list of paths and glob patterns into CSV files, keeping the order given."""
+    files = []
+    for source in sources:
+        matches = sorted(glob.glob(source)) if glob.has_magic(source) else [source]
+        files.extend(f for f in matches if f not in files)
+    return files
+
+def split_csv(csv_file, parts, start, end):
+    """
+    Split the byte range [start, end) of a CSV into up to `parts` ranges that start
+    and end on line boundaries. Records must not contain embedded newlines, which
+    holds for the vertical feeds.
+    """
+    boundaries = [start]
+    step = max((end - start) // max(parts, 1), 1)
+    with open(csv_file, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(max(start + i * step, boundaries[-1]))
+            f.readline()  # Move to the start of the next full line
+            if f.tell() >= end:
+                break
+            if f.tell() > boundaries[-1]:
+                boundaries.append(f.tell())
+    boundaries.append(end)
+
+    return [(a, b) for a, b in zip(boundaries, boundaries[1:]) if b > a]
+
+def _detect_date_format(csv_file, plan):
+    """
+    Return a file's Purchase Date format: the one in its ledger entry, otherwise
+    the one detected from the first rows of the plan with a date that parses, or
+    None if no row does.
+    """
+    if plan['date_format']:
+        return plan['date_format']
+    for df in _read_csv_range(csv_file, plan['columns'], plan['start'], plan['end'],
+                              chunksize=DATE_FORMAT_SAMPLE_SIZE):
+        date_format = _purchase_date_format(df['Purchase Date'])
+        if date_format:
+            return date_format
+    return None
+
+def _parse_slice(csv_file, columns, start, end, date_format, category, seed):
+    """Worker: parse and transform one byte range of a CSV."""
+    rng = np.random.default_rng(seed)
+    df = _read_csv_range(csv_file, columns, start, end)
+    return _transform_chunk(df, rng, date_format, category)
+
+def ingest_files(sources, db_path=None, workers=None, parts_per_file=None, seed=None, bulk=False):
+    """
+    Parse and transform several customer CSVs in a process pool and load them.
+    Args:
+        sources: CSV paths and/or glob patterns
+        db_path: Load every file into this database. By default each file goes
+            into its own database, data/<file name>.db
+        workers: Number of worker processes (defaults to the CPU count)
+        parts_per_file: Number of byte ranges each file is split into, so large
+            files are parsed in parallel too (defaults to the worker count)
+        seed: Seed for the synthetic data generator
+        bulk: Load each target database in bulk-load mode (see
+            data_ingestion.bulk_load_session)
+    """
+    files = resolve_sources(sources)
+    if not files:
+        raise ValueError(f"No CSV files match: {', '.join(sources)}")
+
+    workers = workers or os.cpu_count() or 1
+    parts_per_file = parts_per_file or workers
+
+    # Plan the work: every byte range of every file not loaded yet is one task
+    connections = {}
+    plans = {}
+    tasks = []
+    for csv_file in files:
+        target = db_path or os.path.join('data', os.path.splitext(os.path.basename(csv_file))[0] + '.db')
+        if target not in connections:
+            init_db(target)
+            connections[target] = get_db_connection(target)
+
+        plan = plan_incremental_load(connections[target], csv_file)
+        if plan['start'] >= plan['end']:
+            print(f"{csv_file} has no new rows since the last load ({plan['row_count']} rows loaded)")
+            continue
+
+        ranges = split_csv(csv_file, parts_per_file, plan['start'], plan['end'])
+        plans[csv_file] = {'target': target, 'plan': plan, 'pending': len(ranges), 'rows': 0}
+        # Without a date that parses there is nothing to load under any format
+        plan['date_format'] = _detect_date_format(csv_file, plan)
+        date_format = plan['date_format'] or PURCHASE_DATE_FORMATS[0]
+        for start, end in ranges:
+            tasks.append((csv_file, plan['columns'], start, end, date_format, vertical_name(csv_file)))
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+
+    # Parse in the pool; this process is the only writer, holding one connection per target DB
+    load_start = time.perf_counter()
+
+    try:
+        with contextlib.ExitStack() as sessions:
+            if bulk:
+                for conn in connections.values():
+                    sessions.enter_context(bulk_load_session(conn))
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(_parse_slice, *task, task_seed): task[0]
+                    for task, task_seed in zip(tasks, seeds)
+                }
+
+                for future in as_completed(futures):
+                    csv_file = futures[future]
+                    progress = plans[csv_file]
+                    conn = connections[progress['target']]
+                    customers_df, orders_df, order_items_df, products_df, engagement_df, rejects_df = \
+                        future.result()
+
+                    _write_chunk(conn, customers_df, orders_df, order_items_df, products_df, engagement_df,
+                                 sort_keys=bulk)
+                    _write_rejects(csv_file, rejects_df)
+                    progress['rows'] += len(customers_df)
+                    progress['pending'] -= 1
+
+                    # Advance the ledger together with the file's last range
+                    if progress['pending'] == 0:
+                        record_incremental_load(conn, progress['plan'], progress['rows'])
+                    if not bulk:
+                        conn.commit()
+    finally:
+        for conn in connections.values():
+            conn.close()
+
+    elapsed = time.perf_counter() - load_start
+    total_rows = sum(progress['rows'] for progress in plans.values())
+    for csv_file, progress in plans.items():
+        print(f"Loaded {progress['rows']} customer records from {csv_file}")
+    print(f"Loaded {total_rows} records from {len(files)} files with {workers} workers in {elapsed:.2f}s "
+          f"({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load several vertical customer CSVs in parallel.')
+    parser.add_argument('sources', nargs='*', default=VERTICAL_FILES,
+                        help='CSV files or glob patterns (defaults to all vertical feeds)')
+    parser.add_argument('--db', default=None,
+                        help='Load everything into this database instead of one database per file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (defaults to the CPU count)')
+    parser.add_argument('--parts-per-file', type=int, default=None,
+                        help='Byte ranges to split each file into (defaults to the worker count)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the synthetic data generator')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Load in one transaction per database with tuned pragmas and deferred indexes')
+    args = parser.parse_args()
+
+    ingest_files(args.sources, db_path=args.db, workers=args.workers,
+                 parts_per_file=args.parts_per_file, seed=args.seed, bulk=args.bulk)
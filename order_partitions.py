@@ -0,0 +1,195 @@
+import argparse
+import json
+import sqlite3
+from datetime import date
+
+from db_setup import init_db
+
+# The last this many whole months stay in the live orders table; earlier months are partitioned
+KEEP_MONTHS = 12
+
+# Columns of orders, in the order every partition stores and returns them
+ORDER_COLUMNS = ['id', 'order_id', 'customer_key', 'order_date', 'order_day', 'total_amount', 'status']
+
+# Columns an order line adds to its order
+ITEM_COLUMNS = ['product_key', 'quantity', 'unit_price']
+
+def _day_number(value):
+    return (value - date(1970, 1, 1)).days
+
+def _month_bounds(month):
+    """Return the first day and the first day after a 'YYYY-MM' month, as day numbers."""
+    year, number = map(int, month.split('-'))
+    next_year, next_number = divmod(year * 12 + number, 12)
+    return _day_number(date(year, number, 1)), _day_number(date(next_year, next_number + 1, 1))
+
+def partition_tables(month):
+    """Return the names of a month's orders and order_items partitions."""
+    suffix = month.replace('-', '_')
+    return f'orders_{suffix}', f'order_items_{suffix}'
+
+def _create_partition(cursor, month):
+    """Create one month's partition tables with the live tables' keys and indexes."""
+    orders, items = partition_tables(month)
+    cursor.execute(f'''
+    CREATE TABLE {orders} (
+        id INTEGER PRIMARY KEY,
+        order_id TEXT NOT NULL,
+        customer_key INTEGER REFERENCES customers (id),
+        order_date TIMESTAMP,
+        order_day INTEGER,
+        total_amount REAL,
+        status TEXT
+    )
+    ''')
+    cursor.execute(f'''
+    CREATE TABLE {items} (
+        order_key INTEGER NOT NULL REFERENCES {orders} (id),
+        product_key INTEGER NOT NULL REFERENCES products (id),
+        quantity INTEGER,
+        unit_price REAL,
+        PRIMARY KEY (order_key, product_key)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'CREATE UNIQUE INDEX idx_{orders}_order_id ON {orders} (order_id)')
+    cursor.execute(f'CREATE INDEX idx_{orders}_customer_key_order_day ON {orders} (customer_key, order_day, total_amount)')
+    cursor.execute(f'CREATE INDEX idx_{orders}_order_day ON {orders} (order_day, total_amount)')
+    cursor.execute(f'CREATE INDEX idx_{items}_product_key ON {items} (product_key)')
+
+def _make_read_only(cursor, table):
+    """Reject every later insert, update and delete on a partition table."""
+    for action in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+        CREATE TRIGGER {table}_read_only_{action.lower()} BEFORE {action} ON {table}
+        BEGIN
+            SELECT RAISE(ABORT, '{table} is an archived partition and is read-only');
+        END
+        ''')
+
+def partition_orders(db_path='data/farm_customers.db', keep_months=KEEP_MONTHS, today=None):
+    """
+    Move the orders of every whole month before the last `keep_months` months,
+    with their items, out of the live orders and order_items tables into
+    read-only tables of their own, one month per transaction. A month is
+    partitioned once; orders for it that arrive later stay in the live tables.
+    Returns (month, orders, order items) for every month partitioned.
+    """
+    init_db(db_path)
+    today = today or date.today()
+    cutoff_year, cutoff_month = divmod(today.year * 12 + today.month - 1 - keep_months, 12)
+    cutoff_day = _day_number(date(cutoff_year, cutoff_month + 1, 1))
+
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        months = [month for (month,) in cursor.execute('''
+            SELECT DISTINCT strftime('%Y-%m', order_day * 86400, 'unixepoch') FROM orders
+            WHERE order_day < ? AND strftime('%Y-%m', order_day * 86400, 'unixepoch') NOT IN (
+                SELECT month FROM order_partitions
+            )
+            ORDER BY 1
+        ''', (cutoff_day,)).fetchall()]
+
+        partitioned = []
+        for month in months:
+            first_day, end_day = _month_bounds(month)
+            orders, items = partition_tables(month)
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                _create_partition(cursor, month)
+                columns = ', '.join(ORDER_COLUMNS)
+                cursor.execute(f'''
+                INSERT INTO {orders} ({columns})
+                SELECT {columns} FROM orders
+                WHERE order_day >= ? AND order_day < ?
+                ''', (first_day, end_day))
+                n_orders = cursor.rowcount
+                cursor.execute(f'''
+                INSERT INTO {items} (order_key, product_key, quantity, unit_price)
+                SELECT oi.order_key, oi.product_key, oi.quantity, oi.unit_price
+                FROM {orders} o
+                JOIN order_items oi ON oi.order_key = o.id
+                ''')
+                n_items = cursor.rowcount
+                cursor.execute(f'DELETE FROM order_items WHERE order_key IN (SELECT id FROM {orders})')
+                cursor.execute('DELETE FROM orders WHERE order_day >= ? AND order_day < ?', (first_day, end_day))
+
+                _make_read_only(cursor, orders)
+                _make_read_only(cursor, items)
+                cursor.execute(f'ANALYZE {orders}')
+                cursor.execute(f'ANALYZE {items}')
+                cursor.execute('''
+                INSERT INTO order_partitions (month, first_day, end_day, orders, order_items)
+                VALUES (?, ?, ?, ?, ?)
+                ''', (month, first_day, end_day, n_orders, n_items))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            partitioned.append((month, n_orders, n_items))
+        return partitioned
+    finally:
+        conn.close()
+
+def order_sources(conn, first_day=None, end_day=None):
+    """
+    Return SQL sources for the orders, and the order lines (orders joined to
+    their items, one row per item), that can fall in [first_day, end_day): the
+    live tables plus only the partitions overlapping that range. Without
+    overlapping partitions they are the live tables alone.
+    """
+    query = 'SELECT month FROM order_partitions WHERE 1=1'
+    params = []
+    if first_day is not None:
+        query += ' AND end_day > ?'
+        params.append(first_day)
+    if end_day is not None:
+        query += ' AND first_day < ?'
+        params.append(end_day)
+    months = [month for (month,) in conn.execute(query + ' ORDER BY month', params)]
+
+    order_columns = ', '.join(f'o.{c}' for c in ORDER_COLUMNS)
+    line_columns = order_columns + ', ' + ', '.join(f'oi.{c}' for c in ITEM_COLUMNS)
+    tables = [('orders', 'order_items')] + [partition_tables(month) for month in months]
+
+    lines = ' UNION ALL '.join(
+        f'SELECT {line_columns} FROM {orders} o JOIN {items} oi ON oi.order_key = o.id'
+        for orders, items in tables
+    )
+    if not months:
+        return 'orders', f'({lines})'
+    orders = ' UNION ALL '.join(f'SELECT {order_columns} FROM {orders} o' for orders, _ in tables)
+    return f'({orders})', f'({lines})'
+
+def skip_partitioned_orders(conn, orders_df, order_items_df):
+    """
+    Drop from a batch about to be inserted the orders, and their items, that
+    were already loaded and have since been moved into a partition, where the
+    live table's unique order_id can't see them.
+    """
+    partitioned = []
+    for month, first_day, end_day in conn.execute('SELECT month, first_day, end_day FROM order_partitions'):
+        in_month = orders_df['order_day'].between(first_day, end_day - 1)
+        if not in_month.any():
+            continue
+        orders, _ = partition_tables(month)
+        ids = json.dumps(orders_df.loc[in_month, 'order_id'].tolist())
+        partitioned += [order_id for (order_id,) in conn.execute(
+            f'SELECT order_id FROM {orders} WHERE order_id IN (SELECT value FROM json_each(?))', (ids,))]
+
+    if not partitioned:
+        return orders_df, order_items_df
+    return (orders_df[~orders_df['order_id'].isin(partitioned)],
+            order_items_df[~order_items_df['order_id'].isin(partitioned)])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Move old months of orders into read-only monthly partitions.')
+    parser.add_argument('--db-path', default='data/farm_customers.db', help='Database to partition')
+    parser.add_argument('--keep-months', type=int, default=KEEP_MONTHS,
+                        help='Whole months to keep in the live orders table')
+    args = parser.parse_args()
+
+    partitioned = partition_orders(args.db_path, args.keep_months)
+    for month, n_orders, n_items in partitioned:
+        print(f"{month}: moved {n_orders} orders and {n_items} order items to {partition_tables(month)[0]}")
+    print(f"Partitioned {len(partitioned)} month(s)")
@@ -484,7 +484,11 @@ elif page == "Topping Analysis":
             st.metric("Total Orders with Toppings", popular_toppings['times_ordered'].sum())
         with col3:
             st.metric("Average Price per Topping", f"${popular_toppings['price'].mean():.2f}")
-        
+
+        # Toppings ordered together on the same item
+        st.subheader("Popular Topping Pairs")
+        st.dataframe(db.get_topping_pairs())
+
         # Display raw data
         st.subheader("Topping Details")
         st.dataframe(popular_toppings)
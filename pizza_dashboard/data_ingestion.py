@@ -1,177 +1,331 @@
+import argparse
 import pandas as pd
-import sqlite3
 from datetime import datetime
-import uuid
 import numpy as np
 import time
 import os
+import sys
+
+from db_profiles import connect
+from db_setup import ENGAGEMENT_LOOKUPS, update_customer_summaries, update_daily_rollups
+from db_writer import DatabaseWriter
 
 def get_db_connection():
-    """Create a database connection with proper timeout and isolation level."""
-    conn = sqlite3.connect('data/pizza_customers.db', timeout=20)
-    conn.execute('PRAGMA journal_mode=WAL')  # Use Write-Ahead Logging
-    return conn
-
-def load_customer_data(csv_file):
-    max_retries = 3
-    retry_delay = 2  # seconds
-    
-    for attempt in range(max_retries):
-        try:
-            # Read the CSV file
-            df = pd.read_csv(csv_file)
-            
-            # Rename columns to match database schema
-            df = df.rename(columns={
-                'First Name': 'first_name',
-                'Last Name': 'last_name',
-                'Street Address': 'address',
-                'Zip Code': 'zip_code',
-                'City': 'city',
-                'State': 'state'
-            })
-            
-            # Generate unique customer IDs and email/phone
-            df['customer_id'] = [f'CUST_{uuid.uuid4().hex[:8]}' for _ in range(len(df))]
-            df['email'] = df.apply(lambda x: f"{x['first_name'].lower()}.{x['last_name'].lower()}@example.com", axis=1)
-            df['phone'] = df.apply(lambda x: f"+1-555-{np.random.randint(100,999)}-{np.random.randint(1000,9999)}", axis=1)
-            
-            # Select and reorder columns to match database schema
-            customers_df = df[['customer_id', 'first_name', 'last_name', 'email', 'phone', 
-                          'address', 'city', 'state', 'zip_code']]
+    """Create a database connection tuned for loading (WAL, 20s busy timeout; see db_profiles)."""
+    return connect('data/pizza_customers.db', 'ingestion')
+
+# Sample menu loaded alongside the customers
+PRODUCTS = [
+    ('P001', 'Margherita', 'Classic tomato and mozzarella', 10.99, 'Pizza', 'Medium'),
+    ('P002', 'Pepperoni', 'Classic pepperoni pizza', 12.99, 'Pizza', 'Medium'),
+    ('P003', 'Vegetarian', 'Mixed vegetable pizza', 11.99, 'Pizza', 'Medium'),
+    ('P004', 'Hawaiian', 'Ham and pineapple pizza', 13.99, 'Pizza', 'Medium'),
+    ('P005', 'BBQ Chicken', 'BBQ sauce and chicken pizza', 14.99, 'Pizza', 'Medium'),
+    ('D001', 'Garlic Bread', 'Fresh baked garlic bread', 4.99, 'Side', 'Regular'),
+    ('D002', 'Caesar Salad', 'Fresh Caesar salad', 6.99, 'Side', 'Regular'),
+    ('D003', 'Chicken Wings', 'Spicy chicken wings', 8.99, 'Side', 'Regular'),
+    ('B001', 'Coke', 'Regular Coke', 2.99, 'Beverage', 'Regular'),
+    ('B002', 'Sprite', 'Regular Sprite', 2.99, 'Beverage', 'Regular')
+]
+
+TOPPINGS = [
+    ('T001', 'Extra Cheese', 1.99, 'Cheese'),
+    ('T002', 'Pepperoni', 1.99, 'Meat'),
+    ('T003', 'Mushrooms', 1.49, 'Vegetable'),
+    ('T004', 'Onions', 1.49, 'Vegetable'),
+    ('T005', 'Sausage', 1.99, 'Meat'),
+    ('T006', 'Bell Peppers', 1.49, 'Vegetable'),
+    ('T007', 'Olives', 1.49, 'Vegetable'),
+    ('T008', 'Bacon', 1.99, 'Meat')
+]
+
+PAYMENT_METHODS = ['Credit Card', 'Cash', 'Debit Card']
+DELIVERY_TYPES = ['Delivery', 'Pickup']
+
+# Comma-separated topping IDs for every topping bitmask (bit i is TOPPINGS[i])
+TOPPING_LISTS = np.array([
+    ','.join(t[0] for i, t in enumerate(TOPPINGS) if mask & (1 << i))
+    for mask in range(1 << len(TOPPINGS))
+], dtype=object)
+
+# Columns of the customer CSV that the loader uses
+CSV_COLUMNS = ['First Name', 'Last Name', 'Street Address', 'City', 'State', 'Zip Code']
+
+# Optional CRM engagement columns, loaded when a feed has them
+ENGAGEMENT_COLUMNS = list(ENGAGEMENT_LOOKUPS)
+
+def _peak_rss_mb():
+    """Return the peak resident set size of this process in MB (None if unavailable)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _random_ids(prefix, n):
+    """
+    Generate n random IDs of the form f'{prefix}{8 hex digits}' in one call.
+    The digits come from os.urandom, not the seeded generator, so re-running a
+    seeded load into the same database still gets IDs of its own.
+    """
+    # One read of 4 random bytes per ID, hex-encoded and split into 8-character slices
+    hex_ids = np.frombuffer(os.urandom(4 * n).hex().encode('ascii'), dtype='S8').astype(str)
+    return prefix + pd.Series(hex_ids)
+
+def _rows(df):
+    """Iterate over a frame's rows as tuples of native Python values for executemany."""
+    return zip(*(df[column].tolist() for column in df.columns))
+
+def _contact_details(df, rng):
+    """Derive synthetic email addresses and phone numbers for a frame of customers."""
+    email = df['first_name'].str.lower() + '.' + df['last_name'].str.lower() + '@example.com'
+    
+    # One batched draw per phone number block, same ranges as np.random.randint(100, 999) etc.
+    exchange = pd.Series(rng.integers(100, 999, size=len(df)), index=df.index).astype(str)
+    line = pd.Series(rng.integers(1000, 9999, size=len(df)), index=df.index).astype(str)
+    phone = '+1-555-' + exchange + '-' + line
+    
+    return email, phone
+
+def _prepare_customers(df, rng):
+    """Rename CSV columns and derive customer IDs and contact details."""
+    # Rename columns to match database schema
+    df = df.rename(columns={
+        'First Name': 'first_name',
+        'Last Name': 'last_name',
+        'Street Address': 'address',
+        'Zip Code': 'zip_code',
+        'City': 'city',
+        'State': 'state'
+    })
+    
+    # Generate unique customer IDs and email/phone
+    df['customer_id'] = _random_ids('CUST_', len(df)).to_numpy()
+    df['email'], df['phone'] = _contact_details(df, rng)
+    
+    # Select and reorder columns to match database schema
+    return df[['customer_id', 'first_name', 'last_name', 'email', 'phone', 
+               'address', 'city', 'state', 'zip_code']]
+
+def _prepare_engagement(df, customers_df):
+    """Take the customers' CRM engagement attributes, as text, from a chunk; missing columns are left empty."""
+    engagement_df = pd.DataFrame({'customer_id': customers_df['customer_id']})
+    for column in ENGAGEMENT_COLUMNS:
+        values = df[column] if column in df else pd.Series(None, index=df.index, dtype=object)
+        engagement_df[column] = values.astype(str).where(values.notna(), None)
+    return engagement_df
+
+def _simulate_orders(customers_df, rng):
+    """
+    Generate sample orders and order items for a frame of customers.
+    Every count and choice is drawn as one array for the whole frame and expanded
+    with np.repeat: 1-3 orders per customer, 1-3 items per order, 1-2 of each
+    item and 0-3 distinct toppings per item, held as a bitmask over TOPPINGS.
+    Order totals are the sums of their items. Returns the orders, the order items
+    and one row per topping of an item ('item' is its position in order_items_df).
+    """
+    # Generate 1-3 orders per customer
+    num_orders = rng.integers(1, 4, size=len(customers_df))
+    order_customers = np.repeat(customers_df['customer_id'].to_numpy(), num_orders)
+    n_orders = len(order_customers)
+    
+    order_ids = _random_ids('ORD_', n_orders)
+    order_dates = (pd.Timestamp(datetime.now()) - pd.to_timedelta(rng.integers(0, 365, size=n_orders), unit='D'))
+    
+    # Add 1-3 items to each order
+    num_items = rng.integers(1, 4, size=n_orders)
+    item_orders = np.repeat(np.arange(n_orders), num_items)
+    n_items = len(item_orders)
+    
+    products = rng.integers(0, len(PRODUCTS), size=n_items)
+    quantities = rng.integers(1, 3, size=n_items)
+    unit_prices = np.array([p[3] for p in PRODUCTS])[products]
+    
+    # Random toppings (0-3 distinct toppings per item): rank the toppings of every
+    # item in random order and keep the first num_toppings of them
+    num_toppings = rng.integers(0, 4, size=n_items)
+    ranks = rng.random((n_items, len(TOPPINGS))).argsort(axis=1).argsort(axis=1)
+    has_topping = ranks < num_toppings[:, None]
+    topping_masks = (has_topping << np.arange(len(TOPPINGS))).sum(axis=1)
+    
+    orders_df = pd.DataFrame({
+        'order_id': order_ids,
+        'customer_id': order_customers,
+        'order_date': order_dates.strftime('%Y-%m-%d %H:%M:%S'),
+        'total_amount': np.round(np.bincount(item_orders, weights=quantities * unit_prices, minlength=n_orders), 2),
+        'status': 'Completed',
+        'payment_method': np.array(PAYMENT_METHODS)[rng.integers(0, len(PAYMENT_METHODS), size=n_orders)],
+        'delivery_type': np.array(DELIVERY_TYPES)[rng.integers(0, len(DELIVERY_TYPES), size=n_orders)]
+    })
+    
+    order_items_df = pd.DataFrame({
+        'order_id': order_ids.to_numpy()[item_orders],
+        'product_id': np.array([p[0] for p in PRODUCTS])[products],
+        'quantity': quantities,
+        'unit_price': unit_prices,
+        'toppings': TOPPING_LISTS[topping_masks]
+    })
+    
+    topping_items, topping_indexes = np.nonzero(has_topping)
+    order_item_toppings_df = pd.DataFrame({
+        'item': topping_items,
+        'topping_id': np.array([t[0] for t in TOPPINGS])[topping_indexes]
+    })
+    
+    return orders_df, order_items_df, order_item_toppings_df
+
+def _write_chunk(conn, customers_df, orders_df, order_items_df, order_item_toppings_df, engagement_df):
+    """
+    Insert one chunk of customers with their CRM engagement attributes and
+    simulated orders, order items and toppings, and add the orders to the daily
+    rollups and customer summaries.
+    """
+    # Take the write lock before reading the id watermarks, so no other writer can
+    # add orders between the read and the insert
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    last_order_id, last_item_id = conn.execute(
+        'SELECT (SELECT IFNULL(MAX(id), 0) FROM orders), (SELECT IFNULL(MAX(id), 0) FROM order_items)').fetchone()
+    
+    # Insert customers; executemany rather than to_sql, which would commit the
+    # batch's transaction halfway through
+    conn.executemany('''
+        INSERT INTO customers (customer_id, first_name, last_name, email, phone, address, city, state, zip_code)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', _rows(customers_df))
+    _write_engagement(conn, engagement_df)
+    
+    # Insert orders
+    conn.executemany('''
+        INSERT INTO orders (order_id, customer_id, order_date, total_amount, status, payment_method, delivery_type)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', _rows(orders_df))
+    
+    # Insert order items
+    conn.executemany('''
+        INSERT INTO order_items (order_id, product_id, quantity, unit_price, toppings)
+        VALUES (?, ?, ?, ?, ?)
+    ''', _rows(order_items_df))
+    
+    # The writer holds the write lock, so the items just inserted are the ones above
+    # the watermark; AUTOINCREMENT hands out rising ids, so id order is frame order
+    if not order_item_toppings_df.empty:
+        item_ids = np.array([item_id for (item_id,) in conn.execute(
+            'SELECT id FROM order_items WHERE id > ? ORDER BY id', (last_item_id,))])
+        topping_keys = dict(conn.execute('SELECT topping_id, id FROM toppings'))
+        conn.executemany('''
+            INSERT INTO order_item_toppings (order_item_id, topping_key)
+            VALUES (?, ?)
+        ''', zip(item_ids[order_item_toppings_df['item'].to_numpy()].tolist(),
+                 order_item_toppings_df['topping_id'].map(topping_keys).tolist()))
+    
+    update_daily_rollups(conn.cursor(), last_order_id, last_item_id)
+    update_customer_summaries(conn.cursor(), last_order_id)
+
+def _write_engagement(conn, engagement_df):
+    """
+    Encode engagement attributes as codes into their lookup tables, adding values
+    not seen before, and upsert each customer's codes.
+    """
+    codes_df = pd.DataFrame({'customer_id': engagement_df['customer_id']})
+    for column, (table, code_column) in ENGAGEMENT_LOOKUPS.items():
+        values = engagement_df[column]
+        conn.executemany(f'''
+            INSERT INTO {table} (name) VALUES (?)
+            ON CONFLICT (name) DO NOTHING
+        ''', ((value,) for value in values.dropna().unique().tolist()))
+        
+        codes = values.map(dict(conn.execute(f'SELECT name, id FROM {table}').fetchall())).astype('Int64')
+        codes_df[code_column] = codes.astype(object).where(codes.notna(), None)
+    
+    conn.executemany('''
+        INSERT INTO customer_engagement (customer_id, client_type_id, channel_id, frequency_id, outcome_id, profile_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (customer_id) DO UPDATE SET
+            client_type_id = excluded.client_type_id,
+            channel_id = excluded.channel_id,
+            frequency_id = excluded.frequency_id,
+            outcome_id = excluded.outcome_id,
+            profile_id = excluded.profile_id
+    ''', _rows(codes_df))
+
+def _write_menu(conn):
+    """Insert the sample products and any toppings not yet on the menu."""
+    conn.executemany('''
+        INSERT INTO products (product_id, name, description, price, category, size)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', PRODUCTS)
+    conn.executemany('''
+        INSERT INTO toppings (topping_id, name, price, category)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (topping_id) DO NOTHING
+    ''', TOPPINGS)
+
+def load_customer_data(csv_file, chunksize=None, seed=None):
+    """
+    Load a customer CSV into the database and simulate their orders.
+    Chunks are written by a DatabaseWriter while the next one is parsed, so a
+    transiently locked database delays a single chunk rather than the whole load.
+    Args:
+        csv_file: Path to the customer CSV
+        chunksize: If set, stream the file in chunks of this many rows, writing and
+            committing each chunk separately so memory use stays flat regardless of
+            file size. Rows/sec and peak RSS are reported after every chunk.
+        seed: Seed for the generator behind the synthetic phone numbers and
+            orders, so runs can be reproduced; IDs are random on every run
+    """
+    # Read the CSV file, either whole or as a stream of chunks. Only the
+    # columns we load are parsed; the long free-text columns are skipped.
+    usecols = lambda column: column in CSV_COLUMNS or column in ENGAGEMENT_COLUMNS
+    if chunksize:
+        chunks = pd.read_csv(csv_file, usecols=usecols, chunksize=chunksize)
+    else:
+        chunks = [pd.read_csv(csv_file, usecols=usecols)]
+    
+    rng = np.random.default_rng(seed)
+    
+    with DatabaseWriter(get_db_connection) as writer:
+        writer.submit(_write_menu)
+        
+        total_rows = 0
+        load_start = time.perf_counter()
+        
+        for chunk_number, df in enumerate(chunks, start=1):
+            chunk_start = time.perf_counter()
+            customers_df = _prepare_customers(df, rng)
+            engagement_df = _prepare_engagement(df, customers_df)
+            orders_df, order_items_df, order_item_toppings_df = _simulate_orders(customers_df, rng)
             
-            # Connect to the database
-            conn = get_db_connection()
+            # Blocks while the writer is behind, so at most a few chunks are held in memory
+            writer.submit(_write_chunk, customers_df, orders_df, order_items_df, order_item_toppings_df,
+                          engagement_df)
+            total_rows += len(df)
             
-            try:
-                # Load data into customers table
-                customers_df.to_sql('customers', conn, if_exists='append', index=False)
-                
-                # Create sample products
-                products = [
-                    ('P001', 'Margherita', 'Classic tomato and mozzarella', 10.99, 'Pizza', 'Medium'),
-                    ('P002', 'Pepperoni', 'Classic pepperoni pizza', 12.99, 'Pizza', 'Medium'),
-                    ('P003', 'Vegetarian', 'Mixed vegetable pizza', 11.99, 'Pizza', 'Medium'),
-                    ('P004', 'Hawaiian', 'Ham and pineapple pizza', 13.99, 'Pizza', 'Medium'),
-                    ('P005', 'BBQ Chicken', 'BBQ sauce and chicken pizza', 14.99, 'Pizza', 'Medium'),
-                    ('D001', 'Garlic Bread', 'Fresh baked garlic bread', 4.99, 'Side', 'Regular'),
-                    ('D002', 'Caesar Salad', 'Fresh Caesar salad', 6.99, 'Side', 'Regular'),
-                    ('D003', 'Chicken Wings', 'Spicy chicken wings', 8.99, 'Side', 'Regular'),
-                    ('B001', 'Coke', 'Regular Coke', 2.99, 'Beverage', 'Regular'),
-                    ('B002', 'Sprite', 'Regular Sprite', 2.99, 'Beverage', 'Regular')
-                ]
-                
-                # Insert products
-                cursor = conn.cursor()
-                cursor.executemany('''
-                    INSERT INTO products (product_id, name, description, price, category, size)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', products)
-                
-                # Create sample toppings
-                toppings = [
-                    ('T001', 'Extra Cheese', 1.99, 'Cheese'),
-                    ('T002', 'Pepperoni', 1.99, 'Meat'),
-                    ('T003', 'Mushrooms', 1.49, 'Vegetable'),
-                    ('T004', 'Onions', 1.49, 'Vegetable'),
-                    ('T005', 'Sausage', 1.99, 'Meat'),
-                    ('T006', 'Bell Peppers', 1.49, 'Vegetable'),
-                    ('T007', 'Olives', 1.49, 'Vegetable'),
-                    ('T008', 'Bacon', 1.99, 'Meat')
-                ]
-                
-                # Insert toppings
-                cursor.executemany('''
-                    INSERT INTO toppings (topping_id, name, price, category)
-                    VALUES (?, ?, ?, ?)
-                ''', toppings)
-                
-                # Create sample orders
-                orders_data = []
-                order_items_data = []
-                
-                for _, row in df.iterrows():
-                    # Generate 1-3 orders per customer
-                    num_orders = np.random.randint(1, 4)
-                    for _ in range(num_orders):
-                        order_id = f'ORD_{uuid.uuid4().hex[:8]}'
-                        order_date = datetime.now() - pd.Timedelta(days=np.random.randint(0, 365))
-                        
-                        # Random payment method and delivery type
-                        payment_methods = ['Credit Card', 'Cash', 'Debit Card']
-                        delivery_types = ['Delivery', 'Pickup']
-                        
-                        # Create order
-                        orders_data.append((
-                            order_id,
-                            row['customer_id'],
-                            order_date.strftime('%Y-%m-%d %H:%M:%S'),
-                            np.random.uniform(20, 50),  # Random total amount
-                            'Completed',
-                            np.random.choice(payment_methods),
-                            np.random.choice(delivery_types)
-                        ))
-                        
-                        # Add 1-3 items to each order
-                        num_items = np.random.randint(1, 4)
-                        for _ in range(num_items):
-                            product = products[np.random.randint(0, len(products))]
-                            quantity = np.random.randint(1, 3)
-                            
-                            # Random toppings (0-3 toppings per item)
-                            num_toppings = np.random.randint(0, 4)
-                            selected_toppings = np.random.choice([t[0] for t in toppings], num_toppings, replace=False)
-                            toppings_str = ','.join(selected_toppings)
-                            
-                            order_items_data.append((
-                                order_id,
-                                product[0],
-                                quantity,
-                                product[3],
-                                toppings_str
-                            ))
-                
-                # Insert orders
-                cursor.executemany('''
-                    INSERT INTO orders (order_id, customer_id, order_date, total_amount, status, payment_method, delivery_type)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', orders_data)
-                
-                # Insert order items
-                cursor.executemany('''
-                    INSERT INTO order_items (order_id, product_id, quantity, unit_price, toppings)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', order_items_data)
-                
-                # Commit and close
-                conn.commit()
-                print(f"Loaded {len(df)} customer records into the database")
-                print("Database file created at: data/pizza_customers.db")
-                return  # Success, exit the function
-                
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e):
-                    if attempt < max_retries - 1:
-                        print(f"Database is locked. Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
-                        time.sleep(retry_delay)
-                        continue
-                    else:
-                        raise Exception("Failed to access database after multiple attempts. Please ensure no other process is using the database.")
-                else:
-                    raise
-            finally:
-                conn.close()
-                
-        except Exception as e:
-            if attempt < max_retries - 1:
-                print(f"Error occurred: {str(e)}. Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed to load data after {max_retries} attempts: {str(e)}")
+            if chunksize:
+                elapsed = time.perf_counter() - chunk_start
+                peak_rss = _peak_rss_mb()
+                print(f"Chunk {chunk_number}: {len(df)} rows in {elapsed:.2f}s "
+                      f"({len(df) / max(elapsed, 1e-9):,.0f} rows/sec), "
+                      f"peak RSS {'n/a' if peak_rss is None else f'{peak_rss:.1f} MB'}")
+        writer.flush()
+    
+    elapsed = time.perf_counter() - load_start
+    print(f"Loaded {total_rows} customer records into the database "
+          f"({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    print("Database file created at: data/pizza_customers.db")
 
 if __name__ == "__main__":
     # Ensure data directory exists
     os.makedirs('data', exist_ok=True)
     
+    parser = argparse.ArgumentParser(description='Load customer data into the database.')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream the CSV in chunks of this many rows')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the synthetic data generator')
+    args = parser.parse_args()
+    
     # Load customer data from CSV
-    load_customer_data('pizza_shop_customers_final.csv') 
\ No newline at end of file
+    load_customer_data('pizza_shop_customers_final.csv', chunksize=args.chunksize, seed=args.seed) 
\ No newline at end of file
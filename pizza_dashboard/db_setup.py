@@ -1,6 +1,80 @@
 import sqlite3
 import os
 
+# CRM engagement columns of the customer CSV: (lookup table, code column in customer_engagement)
+ENGAGEMENT_LOOKUPS = {
+    'Client Type': ('client_types', 'client_type_id'),
+    'Model of Communication': ('communication_channels', 'channel_id'),
+    'Frequency': ('engagement_frequencies', 'frequency_id'),
+    'Outcome': ('engagement_outcomes', 'outcome_id'),
+    'Customer Profile': ('customer_profiles', 'profile_id')
+}
+
+def update_daily_rollups(cursor, after_order_id=0, after_item_id=0):
+    """
+    Add the orders and order items with an id above `after_order_id` and
+    `after_item_id` to the daily rollups. The loader calls this in the transaction
+    that inserted them, passing the highest ids from before the insert.
+    """
+    cursor.execute('''
+    INSERT INTO daily_sales (sale_date, delivery_type, payment_method, orders, revenue)
+    SELECT date(o.order_date), o.delivery_type, o.payment_method, COUNT(*), IFNULL(SUM(o.total_amount), 0)
+    FROM orders o
+    WHERE o.id > ?
+    GROUP BY date(o.order_date), o.delivery_type, o.payment_method
+    ON CONFLICT (sale_date, delivery_type, payment_method) DO UPDATE SET
+        orders = orders + excluded.orders,
+        revenue = revenue + excluded.revenue
+    ''', (after_order_id,))
+    
+    # Orders are never split across batches, so distinct counts per batch add up
+    cursor.execute('''
+    INSERT INTO daily_product_sales (sale_date, product_id, orders, quantity, revenue)
+    SELECT date(o.order_date), oi.product_id,
+           COUNT(DISTINCT oi.order_id), SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+    FROM order_items oi
+    JOIN orders o ON o.order_id = oi.order_id
+    WHERE oi.id > ?
+    GROUP BY date(o.order_date), oi.product_id
+    ON CONFLICT (sale_date, product_id) DO UPDATE SET
+        orders = orders + excluded.orders,
+        quantity = quantity + excluded.quantity,
+        revenue = revenue + excluded.revenue
+    ''', (after_item_id,))
+    cursor.execute('''
+    INSERT INTO daily_category_sales (sale_date, category, orders, quantity, revenue)
+    SELECT date(o.order_date), p.category,
+           COUNT(DISTINCT oi.order_id), SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+    FROM order_items oi
+    JOIN orders o ON o.order_id = oi.order_id
+    JOIN (SELECT product_id, MIN(category) AS category FROM products GROUP BY product_id) p
+        ON p.product_id = oi.product_id
+    WHERE oi.id > ?
+    GROUP BY date(o.order_date), p.category
+    ON CONFLICT (sale_date, category) DO UPDATE SET
+        orders = orders + excluded.orders,
+        quantity = quantity + excluded.quantity,
+        revenue = revenue + excluded.revenue
+    ''', (after_item_id,))
+
+def update_customer_summaries(cursor, after_order_id=0):
+    """
+    Add the orders with an id above `after_order_id` to their customers' order
+    summaries, in the transaction that inserted them (see update_daily_rollups).
+    """
+    cursor.execute('''
+    INSERT INTO customer_order_summary (customer_id, total_orders, total_spent, first_order_date, last_order_date)
+    SELECT o.customer_id, COUNT(*), IFNULL(SUM(o.total_amount), 0), MIN(o.order_date), MAX(o.order_date)
+    FROM orders o
+    WHERE o.id > ? AND o.customer_id IS NOT NULL
+    GROUP BY o.customer_id
+    ON CONFLICT (customer_id) DO UPDATE SET
+        total_orders = total_orders + excluded.total_orders,
+        total_spent = total_spent + excluded.total_spent,
+        first_order_date = MIN(first_order_date, excluded.first_order_date),
+        last_order_date = MAX(last_order_date, excluded.last_order_date)
+    ''', (after_order_id,))
+
 def init_db():
     # Create database directory if it doesn't exist
     os.makedirs('data', exist_ok=True)
@@ -79,6 +153,128 @@ def init_db():
     )
     ''')
     
+    # One row per topping on the menu: drop copies left by earlier loads, which
+    # inserted the menu every time, keeping the first row of each topping
+    cursor.execute('''
+    DELETE FROM toppings
+    WHERE id NOT IN (SELECT MIN(id) FROM toppings GROUP BY topping_id)
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_toppings_topping_id ON toppings (topping_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders (order_id)')
+    
+    # Create lookup tables for the CRM engagement columns: one row and small integer code per distinct value
+    for table, _ in ENGAGEMENT_LOOKUPS.values():
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''')
+    
+    # Create customer_engagement table: each customer's CRM attributes as lookup codes
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customer_engagement (
+        customer_id TEXT PRIMARY KEY,
+        client_type_id INTEGER REFERENCES client_types (id),
+        channel_id INTEGER REFERENCES communication_channels (id),
+        frequency_id INTEGER REFERENCES engagement_frequencies (id),
+        outcome_id INTEGER REFERENCES engagement_outcomes (id),
+        profile_id INTEGER REFERENCES customer_profiles (id),
+        FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
+    )
+    ''')
+    for column in ('client_type_id', 'channel_id', 'frequency_id', 'outcome_id'):
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_customer_engagement_{column} ON customer_engagement ({column})')
+    
+    # Create order_item_toppings table: which toppings each order item has, as
+    # integer keys, so topping counts and pairs are index lookups rather than
+    # substring matches on order_items.toppings (which is kept for display)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'order_item_toppings'")
+    backfill = cursor.fetchone() is None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_item_toppings (
+        order_item_id INTEGER NOT NULL REFERENCES order_items (id),
+        topping_key INTEGER NOT NULL REFERENCES toppings (id),
+        PRIMARY KEY (order_item_id, topping_key)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_order_item_toppings_topping_key
+    ON order_item_toppings (topping_key, order_item_id)
+    ''')
+    if backfill:
+        # Split the comma-separated topping IDs of items loaded before the table existed
+        cursor.execute('''
+        INSERT OR IGNORE INTO order_item_toppings (order_item_id, topping_key)
+        SELECT oi.id, t.id
+        FROM order_items oi
+        JOIN json_each('["' || replace(oi.toppings, ',', '","') || '"]') j
+        JOIN toppings t ON t.topping_id = j.value
+        WHERE oi.toppings <> ''
+        ''')
+    
+    # Create the daily rollups: sales per day by delivery type and payment method,
+    # by product and by category, kept up to date by the loader
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_sales'")
+    backfill = cursor.fetchone() is None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS daily_sales (
+        sale_date TEXT NOT NULL,
+        delivery_type TEXT NOT NULL,
+        payment_method TEXT NOT NULL,
+        orders INTEGER NOT NULL,
+        revenue REAL NOT NULL,
+        PRIMARY KEY (sale_date, delivery_type, payment_method)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS daily_product_sales (
+        sale_date TEXT NOT NULL,
+        product_id TEXT NOT NULL,
+        orders INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        revenue REAL NOT NULL,
+        PRIMARY KEY (sale_date, product_id)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS daily_category_sales (
+        sale_date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        orders INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        revenue REAL NOT NULL,
+        PRIMARY KEY (sale_date, category)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_orders_delivery_type_order_date
+    ON orders (delivery_type, order_date, customer_id)
+    ''')
+    if backfill:
+        update_daily_rollups(cursor)
+    
+    # Create customer_order_summary table: every customer's order count, spend
+    # and first/last order, kept up to date by the loader
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customer_order_summary'")
+    backfill = cursor.fetchone() is None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customer_order_summary (
+        customer_id TEXT PRIMARY KEY,
+        total_orders INTEGER NOT NULL,
+        total_spent REAL NOT NULL,
+        first_order_date TIMESTAMP,
+        last_order_date TIMESTAMP
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_customer_order_summary_total_spent
+    ON customer_order_summary (total_spent)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_customers_customer_id ON customers (customer_id)')
+    if backfill:
+        update_customer_summaries(cursor)
+    
     # Commit the changes and close the connection
     conn.commit()
     conn.close()
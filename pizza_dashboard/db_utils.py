@@ -1,11 +1,22 @@
-import sqlite3
 import pandas as pd
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
 
+from db_pool import get_pool
+from db_profiles import profile_settings
+from db_snapshot import current_snapshot
+
 class DatabaseManager:
-    def __init__(self, db_path: str = 'data/pizza_customers.db'):
+    def __init__(self, db_path: str = 'data/pizza_customers.db', profile: str = 'dashboard'):
+        """
+        Args:
+            db_path: Path to the SQLite database
+            profile: Connection profile from db_profiles.PROFILES
+        """
         self.db_path = db_path
+        self.profile = profile
+        # Seconds a snapshot is read before it is refreshed, for snapshot profiles
+        self.snapshot_max_age = profile_settings(profile).get('max_age')
         self.start_date = None
         self.end_date = None
 
@@ -14,7 +25,14 @@ class DatabaseManager:
         self.end_date = end_date
 
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """
+        Borrow a pooled connection for a `with` block; it stays open for later
+        queries. Snapshot profiles read the database's current snapshot instead.
+        """
+        db_path = self.db_path
+        if self.snapshot_max_age is not None:
+            db_path = current_snapshot(db_path, self.snapshot_max_age)
+        return get_pool(db_path, self.profile).connection()
 
     def execute_query(self, query: str, params: tuple = None) -> List[tuple]:
         with self.get_connection() as conn:
@@ -44,13 +62,31 @@ class DatabaseManager:
             query += " AND o.order_date >= ?"
             params.append(self.start_date.strftime('%Y-%m-%d'))
         if self.end_date:
-            query += " AND o.order_date <= ?"
+            query += " AND o.order_date < date(?, '+1 day')"
             params.append(self.end_date.strftime('%Y-%m-%d'))
             
         query += " ORDER BY o.order_date DESC"
         return self.execute_query_df(query, tuple(params))
 
     def get_top_customers(self, limit: int = 10) -> pd.DataFrame:
+        if not (self.start_date or self.end_date):
+            # All-time totals: take the top rows off the summaries' total_spent
+            # index, then look up just those customers
+            query = """
+            SELECT c.customer_id, c.first_name, c.last_name,
+                   s.total_orders, s.total_spent,
+                   s.last_order_date
+            FROM (
+                SELECT customer_id, total_orders, total_spent, last_order_date
+                FROM customer_order_summary
+                ORDER BY total_spent DESC
+                LIMIT ?
+            ) s
+            JOIN customers c ON c.customer_id = s.customer_id
+            ORDER BY s.total_spent DESC
+            """
+            return self.execute_query_df(query, (limit,))
+        
         query = """
         SELECT c.customer_id, c.first_name, c.last_name,
                COUNT(o.order_id) as total_orders,
@@ -67,7 +103,7 @@ class DatabaseManager:
                 query += " AND o.order_date >= ?"
                 params.append(self.start_date.strftime('%Y-%m-%d'))
             if self.end_date:
-                query += " AND o.order_date <= ?"
+                query += " AND o.order_date < date(?, '+1 day')"
                 params.append(self.end_date.strftime('%Y-%m-%d'))
         
         query += """
@@ -78,56 +114,47 @@ class DatabaseManager:
         params.append(limit)
         return self.execute_query_df(query, tuple(params))
 
+    def _rollup_date_filter(self) -> tuple:
+        """The WHERE conditions and parameters restricting a daily rollup `s` to the date filter."""
+        conditions, params = '', []
+        if self.start_date:
+            conditions += " AND s.sale_date >= ?"
+            params.append(self.start_date.strftime('%Y-%m-%d'))
+        if self.end_date:
+            conditions += " AND s.sale_date <= ?"
+            params.append(self.end_date.strftime('%Y-%m-%d'))
+        return conditions, params
+
     def get_product_sales(self) -> pd.DataFrame:
-        query = """
+        conditions, params = self._rollup_date_filter()
+        query = f"""
         SELECT p.product_id, p.name, p.category, p.size,
-               COUNT(DISTINCT o.order_id) as times_ordered,
-               SUM(oi.quantity) as total_quantity,
-               SUM(oi.quantity * oi.unit_price) as total_revenue
-        FROM products p
-        JOIN order_items oi ON p.product_id = oi.product_id
-        JOIN orders o ON oi.order_id = o.order_id
-        """
-        
-        params = []
-        if self.start_date or self.end_date:
-            query += " WHERE 1=1"
-            if self.start_date:
-                query += " AND o.order_date >= ?"
-                params.append(self.start_date.strftime('%Y-%m-%d'))
-            if self.end_date:
-                query += " AND o.order_date <= ?"
-                params.append(self.end_date.strftime('%Y-%m-%d'))
-        
-        query += """
-        GROUP BY p.product_id
-        ORDER BY total_revenue DESC
+               s.times_ordered, s.total_quantity, s.total_revenue
+        FROM (
+            SELECT s.product_id,
+                   SUM(s.orders) as times_ordered,
+                   SUM(s.quantity) as total_quantity,
+                   SUM(s.revenue) as total_revenue
+            FROM daily_product_sales s
+            WHERE 1=1 {conditions}
+            GROUP BY s.product_id
+        ) s
+        JOIN products p ON p.product_id = s.product_id
+        WHERE p.id IN (SELECT MIN(id) FROM products GROUP BY product_id)
+        ORDER BY s.total_revenue DESC
         """
         return self.execute_query_df(query, tuple(params) if params else None)
 
     def get_sales_by_category(self) -> pd.DataFrame:
-        query = """
-        SELECT p.category,
-               COUNT(DISTINCT o.order_id) as total_orders,
-               SUM(oi.quantity) as total_quantity,
-               SUM(oi.quantity * oi.unit_price) as total_revenue
-        FROM products p
-        JOIN order_items oi ON p.product_id = oi.product_id
-        JOIN orders o ON oi.order_id = o.order_id
-        """
-        
-        params = []
-        if self.start_date or self.end_date:
-            query += " WHERE 1=1"
-            if self.start_date:
-                query += " AND o.order_date >= ?"
-                params.append(self.start_date.strftime('%Y-%m-%d'))
-            if self.end_date:
-                query += " AND o.order_date <= ?"
-                params.append(self.end_date.strftime('%Y-%m-%d'))
-        
-        query += """
-        GROUP BY p.category
+        conditions, params = self._rollup_date_filter()
+        query = f"""
+        SELECT s.category,
+               SUM(s.orders) as total_orders,
+               SUM(s.quantity) as total_quantity,
+               SUM(s.revenue) as total_revenue
+        FROM daily_category_sales s
+        WHERE 1=1 {conditions}
+        GROUP BY s.category
         ORDER BY total_revenue DESC
         """
         return self.execute_query_df(query, tuple(params) if params else None)
@@ -186,30 +213,42 @@ class DatabaseManager:
 
     def get_sales_trends(self, days: int = 30) -> pd.DataFrame:
         query = """
-        SELECT DATE(o.order_date) as date, SUM(o.total_amount) as revenue
-        FROM orders o
+        SELECT s.sale_date as date, SUM(s.revenue) as revenue
+        FROM daily_sales s
         WHERE 1=1
         """
         
         params = []
         if self.start_date:
-            query += " AND o.order_date >= ?"
+            query += " AND s.sale_date >= ?"
             params.append(self.start_date.strftime('%Y-%m-%d'))
         elif days:
-            query += " AND o.order_date >= date('now', ?)"
+            query += " AND s.sale_date >= date('now', ?)"
             params.append(f'-{days} days')
             
         if self.end_date:
-            query += " AND o.order_date <= ?"
+            query += " AND s.sale_date <= ?"
             params.append(self.end_date.strftime('%Y-%m-%d'))
         
         query += """
-        GROUP BY DATE(o.order_date)
-        ORDER BY date
+        GROUP BY s.sale_date
+        ORDER BY s.sale_date
         """
         return self.execute_query_df(query, tuple(params) if params else None)
 
     def get_all_customers(self) -> pd.DataFrame:
+        if not (self.start_date or self.end_date):
+            # All-time totals come from the summaries, without touching orders
+            query = """
+            SELECT c.*,
+                   IFNULL(s.total_orders, 0) as total_orders,
+                   s.total_spent,
+                   s.last_order_date
+            FROM customers c
+            LEFT JOIN customer_order_summary s ON s.customer_id = c.customer_id
+            """
+            return self.execute_query_df(query)
+        
         query = """
         SELECT c.*, 
                COUNT(o.order_id) as total_orders,
@@ -226,7 +265,7 @@ class DatabaseManager:
                 query += " AND o.order_date >= ?"
                 params.append(self.start_date.strftime('%Y-%m-%d'))
             if self.end_date:
-                query += " AND o.order_date <= ?"
+                query += " AND o.order_date < date(?, '+1 day')"
                 params.append(self.end_date.strftime('%Y-%m-%d'))
         
         query += " GROUP BY c.customer_id"
@@ -253,7 +292,7 @@ class DatabaseManager:
                 query += " AND o.order_date >= ?"
                 params.append(self.start_date.strftime('%Y-%m-%d'))
             if self.end_date:
-                query += " AND o.order_date <= ?"
+                query += " AND o.order_date < date(?, '+1 day')"
                 params.append(self.end_date.strftime('%Y-%m-%d'))
         
         return self.execute_query_df(query, tuple(params) if params else None)
@@ -264,7 +303,8 @@ class DatabaseManager:
                COUNT(DISTINCT oi.order_id) as times_ordered,
                COUNT(DISTINCT o.customer_id) as unique_customers
         FROM toppings t
-        JOIN order_items oi ON oi.toppings LIKE '%' || t.topping_id || '%'
+        JOIN order_item_toppings it ON it.topping_key = t.id
+        JOIN order_items oi ON oi.id = it.order_item_id
         JOIN orders o ON oi.order_id = o.order_id
         """
         
@@ -275,35 +315,85 @@ class DatabaseManager:
                 query += " AND o.order_date >= ?"
                 params.append(self.start_date.strftime('%Y-%m-%d'))
             if self.end_date:
-                query += " AND o.order_date <= ?"
+                query += " AND o.order_date < date(?, '+1 day')"
                 params.append(self.end_date.strftime('%Y-%m-%d'))
         
         query += """
-        GROUP BY t.topping_id
+        GROUP BY t.id
         ORDER BY times_ordered DESC
         """
         return self.execute_query_df(query, tuple(params) if params else None)
 
-    def get_delivery_stats(self) -> pd.DataFrame:
+    def get_topping_pairs(self, limit: int = 10) -> pd.DataFrame:
+        """The pairs of toppings most often put on the same item, most frequent first."""
         query = """
-        SELECT delivery_type,
-               COUNT(*) as total_orders,
-               AVG(total_amount) as avg_order_value,
-               COUNT(DISTINCT customer_id) as unique_customers
-        FROM orders
+        SELECT ta.name as topping, tb.name as paired_with,
+               COUNT(*) as times_together
+        FROM order_item_toppings a
+        JOIN order_item_toppings b ON b.order_item_id = a.order_item_id AND b.topping_key > a.topping_key
+        JOIN toppings ta ON ta.id = a.topping_key
+        JOIN toppings tb ON tb.id = b.topping_key
         """
         
         params = []
         if self.start_date or self.end_date:
-            query += " WHERE 1=1"
+            query += """
+            JOIN order_items oi ON oi.id = a.order_item_id
+            JOIN orders o ON oi.order_id = o.order_id
+            WHERE 1=1
+            """
             if self.start_date:
-                query += " AND order_date >= ?"
+                query += " AND o.order_date >= ?"
                 params.append(self.start_date.strftime('%Y-%m-%d'))
             if self.end_date:
-                query += " AND order_date <= ?"
+                query += " AND o.order_date < date(?, '+1 day')"
                 params.append(self.end_date.strftime('%Y-%m-%d'))
         
         query += """
-        GROUP BY delivery_type
+        GROUP BY a.topping_key, b.topping_key
+        ORDER BY times_together DESC
+        LIMIT ?
+        """
+        params.append(limit)
+        return self.execute_query_df(query, tuple(params))
+
+    def get_delivery_stats(self) -> pd.DataFrame:
+        """
+        Orders and average order value per delivery type, from the daily rollup.
+        Distinct customers don't add up across days, so they are counted from
+        the orders, using the (delivery_type, order_date, customer_id) index.
+        """
+        conditions, params = self._rollup_date_filter()
+        customer_conditions, customer_params = '', []
+        if self.start_date:
+            customer_conditions += " AND o.order_date >= ?"
+            customer_params.append(self.start_date.strftime('%Y-%m-%d'))
+        if self.end_date:
+            customer_conditions += " AND o.order_date < date(?, '+1 day')"
+            customer_params.append(self.end_date.strftime('%Y-%m-%d'))
+        query = f"""
+        SELECT s.delivery_type,
+               SUM(s.orders) as total_orders,
+               SUM(s.revenue) / SUM(s.orders) as avg_order_value,
+               (SELECT COUNT(DISTINCT o.customer_id) FROM orders o
+                WHERE o.delivery_type = s.delivery_type {customer_conditions}) as unique_customers
+        FROM daily_sales s
+        WHERE 1=1 {conditions}
+        GROUP BY s.delivery_type
+        """
+        return self.execute_query_df(query, tuple(customer_params + params) or None)
+
+    def get_payment_stats(self) -> pd.DataFrame:
+        """Orders, revenue and average order value per payment method, from the daily rollup."""
+        conditions, params = self._rollup_date_filter()
+        query = f"""
+        SELECT s.payment_method,
+               SUM(s.orders) as total_orders,
+               SUM(s.revenue) as total_revenue,
+               SUM(s.revenue) / SUM(s.orders) as avg_order_value
+        FROM daily_sales s
+        WHERE 1=1 {conditions}
+        GROUP BY s.payment_method
+        ORDER BY total_orders DESC
         """
-        return self.execute_query_df(query, tuple(params) if params else None) 
\ No newline at end of file
+        return self.execute_query_df(query, tuple(params) if params else None)